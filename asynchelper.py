@@ -1,8 +1,58 @@
 from concurrent.futures import Future, ThreadPoolExecutor
-from flask import render_template
+from flask import g, has_request_context, render_template
+from functools import wraps
+from os import environ
+from threading import BoundedSemaphore
+from time import time
 
+#every page shares the same query threads instead of starting a new thread for each query
+executor = ThreadPoolExecutor(int(environ.get('QUERY_THREADS', 8)))
+#make pages wait for a free slot instead of letting the executor's queue grow without bound
+query_slots = BoundedSemaphore(int(environ.get('QUERY_QUEUE', 64)))
+queries_per_request = int(environ.get('QUERIES_PER_REQUEST', 4))
+
+#a promise only ever waits on promises that were submitted before it and so started before it, which keeps the
+#bounded executor and slots from deadlocking
 def promise(fn):
-    return lambda *args, **kwargs: ThreadPoolExecutor(1).submit(fn, *args, **kwargs)
+    @wraps(fn)
+    def submit(*args, **kwargs):
+        timing = {'submitted': time()}
+        slots = [query_slots]
+        if has_request_context():
+            if 'query_slots' not in g:
+                g.query_slots = BoundedSemaphore(queries_per_request)
+                g.query_timings = []
+            #take the request's own slot first so that one page cannot fill the shared queue by itself
+            slots.insert(0, g.query_slots)
+            g.query_timings.append(timing)
+        for slot in slots:
+            slot.acquire()
+
+        def run():
+            timing['started'] = time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timing['finished'] = time()
+                for slot in reversed(slots):
+                    slot.release()
+
+        future = executor.submit(run)
+        future.timing = timing
+        return future
+    return submit
+
+def server_timing():
+    #how long the request's queries spent waiting for a thread and how long they spent running
+    timings = [timing for timing in g.get('query_timings', []) if 'finished' in timing]
+    if not timings:
+        return None
+    wait = sum(map(lambda timing: timing['started'] - timing['submitted'], timings))
+    run = sum(map(lambda timing: timing['finished'] - timing['started'], timings))
+    return (
+        'query-wait;dur=' + str(round(wait * 1000, 1)) + ';desc="' + str(len(timings)) + ' queries", ' +
+        'query-run;dur=' + str(round(run * 1000, 1))
+    )
 
 def render_template_async(*args, **kwargs):
     for key in kwargs:
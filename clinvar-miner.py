@@ -2,27 +2,94 @@
 
 import gzip
 import re
-from asynchelper import promise, render_template_async
+from asynchelper import promise, render_template_async, server_timing
 from collections import OrderedDict
 from datetime import datetime
-from db import DB
+from db import DB, MissingReleaseError, get_release, query_cache_timing
 from flask import Flask
 from flask import Response
 from flask import abort
+from flask import g
 from flask import redirect
 from flask import render_template
 from flask import request
+from functools import partial
 from hashlib import sha256
-from os import environ
+from io import BytesIO
+from os import environ, listdir, makedirs, remove, stat
+from os.path import isdir
+from pagecache import PageCache
+from shutil import rmtree
+from sqlite3 import OperationalError
+from sys import stderr
+from threading import Lock, Thread
+from time import sleep, time
 from urllib.parse import urlparse, quote
-from werkzeug.contrib.cache import FileSystemCache
-from werkzeug.contrib.cache import NullCache
 from werkzeug.routing import BaseConverter
 
+try:
+    import brotli
+except ImportError:
+    brotli = None #pages are only cached with gzip
+
 app = Flask(__name__)
-ttl = float(environ.get('TTL', 0)) #zero means infinity to the FileSystemCache
-cache = FileSystemCache('/tmp/clinvar-miner', threshold=1000000) if ttl >= 0 else NullCache()
-cache.clear() #delete the cache when the webserver is restarted
+ttl = float(environ.get('TTL', 0)) #zero means infinity, negative means no caching
+hard_ttl = float(environ.get('HARD_TTL', 0)) #how long a page that has gone stale can still be served, zero means forever
+cache_dir = '/tmp/clinvar-miner'
+cache_bytes = int(environ.get('PAGE_CACHE_BYTES', 4 << 30))
+cache_idle_time = 3600
+caches = {}
+caches_lock = Lock()
+
+def delete_old_caches(namespace):
+    #processes that are still on another release or build keep writing to their cache, so only the caches that nobody
+    #has written to for a while are deleted, looking again once the ones of the release that was just replaced are idle
+    for wait in [0, cache_idle_time]:
+        sleep(wait)
+
+        #the write-ahead log, shared memory and render lock files of a cache start with the same name as it
+        last_modified = {}
+        for name in listdir(cache_dir):
+            try:
+                modified = stat(cache_dir + '/' + name).st_mtime
+            except OSError:
+                continue
+            cache_name = name.partition('.db')[0]
+            last_modified[cache_name] = max(last_modified.get(cache_name, 0), modified)
+
+        for name in listdir(cache_dir):
+            cache_name = name.partition('.db')[0]
+            if cache_name != namespace and last_modified.get(cache_name, 0) < time() - cache_idle_time:
+                path = cache_dir + '/' + name
+                if isdir(path):
+                    rmtree(path, ignore_errors=True) #left by versions that kept a file for every page
+                else:
+                    try:
+                        remove(path)
+                    except OSError:
+                        pass
+
+def get_cache():
+    #pages are kept across restarts in a file for each release and build, so a new current.db or a deploy with a new
+    #BUILD_ID switches to a new file and the old ones are deleted in the background
+    if ttl < 0:
+        return None
+
+    release = get_release()
+    if not release:
+        return None #there is nothing to cache until the first release is built
+    with caches_lock:
+        if release not in caches:
+            namespace = DB().max_date() + '-' + format(release[2], 'x')
+            if environ.get('BUILD_ID'):
+                namespace += '-' + environ['BUILD_ID']
+            for cache in caches.values():
+                cache.close()
+            caches.clear()
+            makedirs(cache_dir, exist_ok=True)
+            caches[release] = PageCache(cache_dir + '/' + namespace + '.db', cache_bytes)
+            Thread(target=delete_old_caches, args=(namespace,), daemon=True).start()
+        return caches[release]
 
 app.jinja_env.trim_blocks = True
 app.jinja_env.lstrip_blocks = True
@@ -157,23 +224,23 @@ def get_conflict_breakdown(total_variants_in_conflict_by_significance_and_signif
     return breakdown
 
 @promise
-def get_conflict_summary_by_condition(total_variants_by_condition, total_variants_potentially_in_conflict_by_condition,
-                                      total_variants_in_conflict_by_condition,
-                                      total_variants_in_conflict_by_condition_and_conflict_level):
+def get_conflict_summary_by_condition(total_variants_by_condition,
+                                      total_variants_in_conflict_by_condition_and_conflict_level, min_conflict_level):
+    total_variants_by_condition = total_variants_by_condition.result()
     summary = OrderedDict()
 
-    for row in total_variants_in_conflict_by_condition.result():
+    for row in total_variants_by_condition[min_conflict_level]:
         condition_name = row['condition_name']
         count = row['count']
         summary[condition_name] = {'any_conflict': count}
 
-    for row in total_variants_potentially_in_conflict_by_condition.result():
+    for row in total_variants_by_condition[0]:
         condition_name = row['condition_name']
         if condition_name in summary: #some conditions have no conflicts at all
             count = row['count']
             summary[condition_name][0] = count - summary[condition_name]['any_conflict']
 
-    for row in total_variants_by_condition.result():
+    for row in total_variants_by_condition[-1]:
         condition_name = row['condition_name']
         if condition_name in summary: #some conditions have no conflicts at all
             count = row['count']
@@ -188,23 +255,23 @@ def get_conflict_summary_by_condition(total_variants_by_condition, total_variant
     return summary
 
 @promise
-def get_conflict_summary_by_gene(total_variants_by_gene, total_variants_potentially_in_conflict_by_gene,
-                                 total_variants_in_conflict_by_gene,
-                                 total_variants_in_conflict_by_gene_and_conflict_level):
+def get_conflict_summary_by_gene(total_variants_by_gene,
+                                 total_variants_in_conflict_by_gene_and_conflict_level, min_conflict_level):
+    total_variants_by_gene = total_variants_by_gene.result()
     summary = OrderedDict()
 
-    for row in total_variants_in_conflict_by_gene.result():
+    for row in total_variants_by_gene[min_conflict_level]:
         gene = row['gene']
         count = row['count']
         summary[gene] = {'any_conflict': count}
 
-    for row in total_variants_potentially_in_conflict_by_gene.result():
+    for row in total_variants_by_gene[0]:
         gene = row['gene']
         if gene in summary: #some genes have no conflicts at all
             count = row['count']
             summary[gene][0] = count - summary[gene]['any_conflict']
 
-    for row in total_variants_by_gene.result():
+    for row in total_variants_by_gene[-1]:
         gene = row['gene']
         if gene in summary: #some genes have no conflicts at all
             count = row['count']
@@ -219,24 +286,24 @@ def get_conflict_summary_by_gene(total_variants_by_gene, total_variants_potentia
     return summary
 
 @promise
-def get_conflict_summary_by_submitter(total_variants_by_submitter, total_variants_potentially_in_conflict_by_submitter,
-                                      total_variants_in_conflict_by_submitter,
-                                      total_variants_in_conflict_by_submitter_and_conflict_level):
+def get_conflict_summary_by_submitter(total_variants_by_submitter,
+                                      total_variants_in_conflict_by_submitter_and_conflict_level, min_conflict_level):
+    total_variants_by_submitter = total_variants_by_submitter.result()
     summary = OrderedDict()
 
-    for row in total_variants_in_conflict_by_submitter.result():
+    for row in total_variants_by_submitter[min_conflict_level]:
         submitter_id = row['submitter_id']
         submitter_name = row['submitter_name']
         count = row['count']
         summary[submitter_id] = {'name': submitter_name, 'any_conflict': count}
 
-    for row in total_variants_potentially_in_conflict_by_submitter.result():
+    for row in total_variants_by_submitter[0]:
         submitter_id = row['submitter_id']
         if submitter_id in summary: #some submitters have no conflicts with anyone
             count = row['count']
             summary[submitter_id][0] = count - summary[submitter_id]['any_conflict']
 
-    for row in total_variants_by_submitter.result():
+    for row in total_variants_by_submitter[-1]:
         submitter_id = row['submitter_id']
         if submitter_id in summary: #some submitters have no conflicts with anyone
             count = row['count']
@@ -464,30 +531,131 @@ def template_functions():
         'variant_link': variant_link,
     }
 
+#after_request functions run in reverse order, so this runs after cache_set and the timing is not cached
+@app.after_request
+def add_server_timing(response):
+    cache = get_cache()
+    timing = ', '.join(filter(None, [server_timing(), query_cache_timing(), cache.timing() if cache else None]))
+    if timing:
+        response.headers.set('Server-Timing', timing)
+    return response
+
+def get_cached_encodings():
+    #the encodings that every cached page is stored in, smallest first
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+def get_encoding():
+    #the smallest encoding that the client takes, or none if it takes neither
+    return request.accept_encodings.best_match(get_cached_encodings()) or 'identity'
+
+def encode_response(response, encoding, etag, body):
+    #a client that does not take gzip gets the gzipped page decompressed, which is the same page in all but its bytes
+    if encoding == 'identity':
+        response.set_data(gzip.decompress(body))
+        response.set_etag(etag, weak=True)
+    else:
+        response.set_data(body)
+        response.set_etag(etag)
+        response.headers.set('Content-Encoding', encoding)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cached_response(page, encoding):
+    g.cached_page = True #so that cache_set does not store it again as a new page
+    if request.if_none_match.contains_weak(page['etag']):
+        response = Response(status=304)
+        response.set_etag(page['etag'], weak=encoding == 'identity')
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return encode_response(Response(content_type=page['content_type']), encoding, page['etag'], page['body'])
+
+def render_again(environ):
+    #a request of its own, which cache_get lets through to be rendered and cache_set stores
+    app(environ, lambda status, headers: None).close()
+
+def revalidation_environ():
+    #the streams and other objects of the request do not outlive it, so only its strings are copied
+    environ = dict(filter(lambda item: type(item[1]) is str, request.environ.items()))
+    environ['wsgi.version'] = (1, 0)
+    environ['wsgi.input'] = BytesIO()
+    environ['wsgi.errors'] = stderr
+    environ['clinvar_miner.revalidate'] = True
+    return environ
+
 @app.before_request
 def cache_get():
-    response = cache.get(request.url)
-    if not response or 'gzip' not in request.accept_encodings:
+    cache = get_cache()
+    if not cache or request.environ.get('clinvar_miner.revalidate'):
         return None
 
-    server_etag = response.get_etag()[0]
-    client_etags = request.if_none_match
-    if server_etag in client_etags:
-        return Response(status=304, headers={'ETag': server_etag})
+    encoding = get_encoding()
+    page = cache.get(request.url, 'gzip' if encoding == 'identity' else encoding)
+    if not page:
+        #wait for any other request that is rendering the same page, or render it while the others wait
+        if cache.lock_render(request.url):
+            g.render_lock = (cache, request.url)
+        page = cache.get(request.url, 'gzip' if encoding == 'identity' else encoding)
+    cache.count(page != None)
+    if not page:
+        return None
 
-    return response
+    if page['stale']:
+        #the next requests get the page as it is rendered now, and this one gets it right away as it was
+        cache.revalidate(request.url, partial(render_again, revalidation_environ()))
+
+    return cached_response(page, encoding)
 
 @app.after_request
 def cache_set(response):
-    if (ttl >= 0 and not cache.has(request.url) and response.status_code == 200 and not response.direct_passthrough and
-            'gzip' in request.accept_encodings):
-        response.set_data(gzip.compress(response.get_data()))
-        response.set_etag(sha256(response.get_data()).hexdigest())
-        response.headers.set('Content-Encoding', 'gzip')
-        response.freeze()
-        cache.set(request.url, response, timeout=ttl)
+    cache = get_cache()
+    if (cache and response.status_code == 200 and not response.direct_passthrough and 'cached_page' not in g and
+            not response.headers.get('Content-Encoding') and
+            not all(map(lambda encoding: cache.has(request.url, encoding), get_cached_encodings()))):
+        #compress the page once for every encoding that the cache serves, which also fills in an encoding that the page
+        #was not stored in before, such as Brotli after it was installed
+        bodies = {}
+        data = response.get_data()
+        body = gzip.compress(data)
+        bodies['gzip'] = (sha256(body).hexdigest(), body)
+        if brotli:
+            body = brotli.compress(data, quality=9) #the best quality takes seconds for the largest pages
+            bodies['br'] = (sha256(body).hexdigest(), body)
+        cache.set(request.url, response.content_type, bodies, ttl, hard_ttl)
+
+        encoding = get_encoding()
+        if encoding == 'identity':
+            #the page is already uncompressed
+            response.set_etag(bodies['gzip'][0], weak=True)
+            response.vary.add('Accept-Encoding')
+        else:
+            encode_response(response, encoding, *bodies[encoding])
     return response
 
+@app.errorhandler(OperationalError)
+def serve_stale_page(error):
+    #when the database is locked or unreadable, a cached page, however old, is better than an error
+    try:
+        cache = get_cache()
+    except OperationalError:
+        raise error #a release that has no cache yet cannot be read to name one either
+    encoding = get_encoding()
+    page = cache.get(request.url, 'gzip' if encoding == 'identity' else encoding, expired=True) if cache else None
+    if not page:
+        raise error
+    return cached_response(page, encoding)
+
+@app.errorhandler(MissingReleaseError)
+def missing_release(error):
+    return str(error), 503
+
+@app.teardown_request
+def cache_unlock(exception):
+    #let the requests waiting for the page take it from the cache, or render it themselves if it was not cached
+    if 'render_lock' in g:
+        cache, url = g.render_lock
+        cache.unlock_render(url)
+
 @app.route('/variants-in-conflict-by-condition')
 @app.route('/variants-in-conflict-by-condition/<superescaped:condition_name>')
 def variants_in_conflict_by_condition(condition_name = None):
@@ -502,6 +670,11 @@ def variants_in_conflict_by_condition(condition_name = None):
 
     if condition_name == None:
         args['condition1_name'] = list_arg('conditions')
+        #the totals are read last so that the page's other queries are already running while they are counted
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0, min_conflict_level],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-condition.html',
             min_conflict_level=min_conflict_level,
@@ -511,34 +684,20 @@ def variants_in_conflict_by_condition(condition_name = None):
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
-            total_variants_in_conflict=DB().total_variants(
-                min_conflict_level=min_conflict_level,
-                **args
-            ),
             summary=get_conflict_summary_by_condition(
-                DB().total_variants_by_condition(
-                    **args
-                ),
-                DB().total_variants_by_condition(
-                    min_conflict_level=0,
-                    **args
-                ),
-                DB().total_variants_by_condition(
-                    min_conflict_level=min_conflict_level,
+                DB().total_variants_by_condition_at_conflict_levels(
+                    min_conflict_levels=[-1, 0, min_conflict_level],
                     **args
                 ),
                 DB().total_variants_in_conflict_by_condition_and_conflict_level(
                     min_conflict_level=min_conflict_level,
                     **args
                 ),
+                min_conflict_level,
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
+            total_variants_in_conflict=totals.result()[min_conflict_level],
         )
 
     if not DB().is_condition_name(condition_name):
@@ -546,6 +705,10 @@ def variants_in_conflict_by_condition(condition_name = None):
     args['condition1_name'] = condition_name
     args['original_terms'] = request.args.get('original_terms')
 
+    totals = DB().total_variants_at_conflict_levels(
+        min_conflict_levels=[-1, 0],
+        **args
+    )
     return render_template_async(
         'variants-in-conflict-by-condition--condition.html',
         condition_name=condition_name,
@@ -557,13 +720,6 @@ def variants_in_conflict_by_condition(condition_name = None):
                 **args
             ),
         ),
-        total_variants=DB().total_variants(
-            **args
-        ),
-        total_variants_potentially_in_conflict=DB().total_variants(
-            min_conflict_level=0,
-            **args
-        ),
         breakdown=get_conflict_breakdown(
             DB().total_variants_in_conflict_by_significance_and_significance(
                 min_conflict_level=min_conflict_level,
@@ -571,26 +727,22 @@ def variants_in_conflict_by_condition(condition_name = None):
             )
         ),
         summary=get_conflict_summary_by_condition(
-            DB().total_variants_by_condition(
-                **args
-            ),
-            DB().total_variants_by_condition(
-                min_conflict_level=0,
-                **args
-            ),
-            DB().total_variants_by_condition(
-                min_conflict_level=min_conflict_level,
+            DB().total_variants_by_condition_at_conflict_levels(
+                min_conflict_levels=[-1, 0, min_conflict_level],
                 **args
             ),
             DB().total_variants_in_conflict_by_condition_and_conflict_level(
                 min_conflict_level=min_conflict_level,
                 **args
             ),
+            min_conflict_level,
         ),
         variants=DB().variants(
             min_conflict_level=min_conflict_level,
             **args
         ),
+        total_variants=totals.result()[-1],
+        total_variants_potentially_in_conflict=totals.result()[0],
     )
 
 @app.route('/variants-in-conflict-by-gene')
@@ -609,6 +761,10 @@ def variants_in_conflict_by_gene(gene = None, significance1 = None, significance
 
     if not gene:
         args['gene'] = list_arg('genes')
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0, min_conflict_level],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-gene.html',
             min_conflict_level=min_conflict_level,
@@ -618,34 +774,20 @@ def variants_in_conflict_by_gene(gene = None, significance1 = None, significance
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
-            total_variants_in_conflict=DB().total_variants(
-                min_conflict_level=min_conflict_level,
-                **args
-            ),
             summary=get_conflict_summary_by_gene(
-                DB().total_variants_by_gene(
-                    **args
-                ),
-                DB().total_variants_by_gene(
-                    min_conflict_level=0,
-                    **args
-                ),
-                DB().total_variants_by_gene(
-                    min_conflict_level=min_conflict_level,
+                DB().total_variants_by_gene_at_conflict_levels(
+                    min_conflict_levels=[-1, 0, min_conflict_level],
                     **args
                 ),
                 DB().total_variants_in_conflict_by_gene_and_conflict_level(
                     min_conflict_level=min_conflict_level,
                     **args
                 ),
+                min_conflict_level,
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
+            total_variants_in_conflict=totals.result()[min_conflict_level],
         )
 
     if gene == 'intergenic':
@@ -657,6 +799,10 @@ def variants_in_conflict_by_gene(gene = None, significance1 = None, significance
     args['original_terms'] = request.args.get('original_terms')
 
     if not significance1:
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-gene--gene.html',
             gene_info=gene_info,
@@ -667,13 +813,6 @@ def variants_in_conflict_by_gene(gene = None, significance1 = None, significance
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
             breakdown=get_conflict_breakdown(
                 DB().total_variants_in_conflict_by_significance_and_significance(
                     min_conflict_level=min_conflict_level,
@@ -684,6 +823,8 @@ def variants_in_conflict_by_gene(gene = None, significance1 = None, significance
                 min_conflict_level=min_conflict_level,
                 **args
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
         )
 
     if not DB().is_significance(significance1) or not DB().is_significance(significance2):
@@ -715,6 +856,10 @@ def variants_in_conflict_by_significance(significance1 = None, significance2 = N
     min_conflict_level = max(1, int_arg('min_conflict_level'))
 
     if not significance2:
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0, min_conflict_level],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-significance.html',
             min_conflict_level=min_conflict_level,
@@ -723,23 +868,15 @@ def variants_in_conflict_by_significance(significance1 = None, significance2 = N
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
-            total_variants_in_conflict=DB().total_variants(
-                min_conflict_level=min_conflict_level,
-                **args
-            ),
             breakdown=get_conflict_breakdown(
                 DB().total_variants_in_conflict_by_significance_and_significance(
                     min_conflict_level=min_conflict_level,
                     **args
                 )
-            )
+            ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
+            total_variants_in_conflict=totals.result()[min_conflict_level],
         )
 
     if not DB().is_significance(significance1) or not DB().is_significance(significance2):
@@ -774,6 +911,10 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
 
     if submitter1_id == None:
         args['submitter1_id'] = list_arg('submitters')
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0, min_conflict_level],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-submitter.html',
             min_conflict_level=min_conflict_level,
@@ -783,34 +924,20 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
-            total_variants_in_conflict=DB().total_variants(
-                min_conflict_level=min_conflict_level,
-                **args
-            ),
             summary=get_conflict_summary_by_submitter(
-                DB().total_variants_by_submitter(
-                    **args
-                ),
-                DB().total_variants_by_submitter(
-                    min_conflict_level=0,
-                    **args
-                ),
-                DB().total_variants_by_submitter(
-                    min_conflict_level=min_conflict_level,
+                DB().total_variants_by_submitter_at_conflict_levels(
+                    min_conflict_levels=[-1, 0, min_conflict_level],
                     **args
                 ),
                 DB().total_variants_in_conflict_by_submitter_and_conflict_level(
                     min_conflict_level=min_conflict_level,
                     **args
                 ),
+                min_conflict_level,
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
+            total_variants_in_conflict=totals.result()[min_conflict_level],
         )
 
     submitter1_info = DB().submitter_info(submitter1_id)
@@ -820,6 +947,10 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
     args['original_terms'] = request.args.get('original_terms')
 
     if submitter2_id == None:
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0, min_conflict_level],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-submitter--1submitter.html',
             submitter1_info=submitter1_info,
@@ -831,33 +962,16 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
-            total_variants_in_conflict=DB().total_variants(
-                min_conflict_level=min_conflict_level,
-                **args
-            ),
             summary=get_conflict_summary_by_submitter(
-                DB().total_variants_by_submitter(
-                    **args
-                ),
-                DB().total_variants_by_submitter(
-                    min_conflict_level=0,
-                    **args
-                ),
-                DB().total_variants_by_submitter(
-                    min_conflict_level=min_conflict_level,
+                DB().total_variants_by_submitter_at_conflict_levels(
+                    min_conflict_levels=[-1, 0, min_conflict_level],
                     **args
                 ),
                 DB().total_variants_in_conflict_by_submitter_and_conflict_level(
                     min_conflict_level=min_conflict_level,
                     **args
                 ),
+                min_conflict_level,
             ),
             breakdown=get_conflict_breakdown(
                 DB().total_variants_in_conflict_by_significance_and_significance(
@@ -869,6 +983,9 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
                 min_conflict_level=min_conflict_level,
                 **args
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
+            total_variants_in_conflict=totals.result()[min_conflict_level],
         )
 
     if submitter2_id == 0:
@@ -880,6 +997,10 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
     args['submitter2_id'] = submitter2_id
 
     if not significance1:
+        totals = DB().total_variants_at_conflict_levels(
+            min_conflict_levels=[-1, 0],
+            **args
+        )
         return render_template_async(
             'variants-in-conflict-by-submitter--2submitters.html',
             submitter1_info=submitter1_info,
@@ -891,13 +1012,6 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
                     **args
                 ),
             ),
-            total_variants=DB().total_variants(
-                **args
-            ),
-            total_variants_potentially_in_conflict=DB().total_variants(
-                min_conflict_level=0,
-                **args
-            ),
             breakdown=get_conflict_breakdown(
                 DB().total_variants_in_conflict_by_significance_and_significance(
                     min_conflict_level=min_conflict_level,
@@ -908,6 +1022,8 @@ def variants_in_conflict_by_submitter(submitter1_id = None, submitter2_id = None
                 min_conflict_level=min_conflict_level,
                 **args
             ),
+            total_variants=totals.result()[-1],
+            total_variants_potentially_in_conflict=totals.result()[0],
         )
 
     if not DB().is_significance(significance1) or not DB().is_significance(significance2):
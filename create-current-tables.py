@@ -1,100 +1,308 @@
 #!/usr/bin/env python3
 
+from os import remove, rename
+from os.path import exists
+from urllib.parse import quote
 import sqlite3
 
 print('Creating current tables')
 
-db = __import__('import-clinvar-xml').connect()
+importer = __import__('import-clinvar-xml')
+
+#build the new tables in their own database and swap it in at the end, so that the site keeps serving the old tables
+if exists('current.db.part'):
+    remove('current.db.part')
+db = importer.connect('current.db.part')
 cursor = db.cursor()
 
-cursor.execute('DROP TABLE IF EXISTS current_submissions')
+#use the newest shard instead of the main tables if it holds the same release or a newer one
+source_filename = 'clinvar.db'
+shard_filenames = importer.get_shard_filenames()
+if shard_filenames:
+    main_db = importer.connect()
+    max_date = list(main_db.execute('SELECT MAX(date) FROM submissions'))[0][0]
+    main_db.close()
+    if not max_date or shard_filenames[-1] >= importer.get_shard_filename(max_date):
+        source_filename = shard_filenames[-1]
+cursor.execute('ATTACH DATABASE ? AS source', ['file:' + quote(source_filename) + '?mode=ro'])
 
 cursor.execute('''
     CREATE TABLE current_submissions AS
-    SELECT * FROM submissions WHERE date=(
-        SELECT MAX(date) FROM submissions
+    SELECT * FROM source.submissions WHERE date=(
+        SELECT MAX(date) FROM source.submissions
     )
 ''')
 
-cursor.execute('CREATE INDEX current_submissions__variant_name ON current_submissions (variant_name)')
+cursor.execute('CREATE INDEX current_submissions__id ON current_submissions (id)')
+cursor.execute('CREATE INDEX current_submissions__variant ON current_submissions (variant)')
 cursor.execute('CREATE INDEX current_submissions__rsid ON current_submissions (rsid)')
 cursor.execute('CREATE INDEX current_submissions__gene ON current_submissions (gene)')
+cursor.execute('CREATE INDEX current_submissions__gene_type ON current_submissions (gene_type)')
 cursor.execute('CREATE INDEX current_submissions__normalized_gene ON current_submissions (normalized_gene)')
+cursor.execute('CREATE INDEX current_submissions__normalized_gene_type ON current_submissions (normalized_gene_type)')
 cursor.execute('CREATE INDEX current_submissions__rcv ON current_submissions (rcv)')
 cursor.execute('CREATE INDEX current_submissions__scv ON current_submissions (scv)')
 cursor.execute('CREATE INDEX current_submissions__submitter_id ON current_submissions (submitter_id)')
-cursor.execute('CREATE INDEX current_submissions__submitter_name ON current_submissions (submitter_name)')
-cursor.execute('CREATE INDEX current_submissions__submitter_country_code ON current_submissions (submitter_country_code)')
 cursor.execute('CREATE INDEX current_submissions__significance ON current_submissions (significance)')
-cursor.execute('CREATE INDEX current_submissions__condition_name ON current_submissions (condition_name)')
-cursor.execute('CREATE INDEX current_submissions__condition_xrefs ON current_submissions (condition_xrefs)')
+cursor.execute('CREATE INDEX current_submissions__star_level ON current_submissions (star_level)')
+cursor.execute('CREATE INDEX current_submissions__normalized_significance ON current_submissions (normalized_significance)')
+cursor.execute('CREATE INDEX current_submissions__condition ON current_submissions (condition)')
 cursor.execute('CREATE INDEX current_submissions__method ON current_submissions (method)')
-
-cursor.execute('DROP TABLE IF EXISTS current_comparisons')
+cursor.execute('CREATE INDEX current_submissions__normalized_method ON current_submissions (normalized_method)')
 
 cursor.execute('''
     CREATE TABLE current_comparisons AS
-    SELECT * FROM comparisons WHERE date=(
-        SELECT MAX(date) FROM comparisons
+    SELECT * FROM source.comparisons WHERE date=(
+        SELECT MAX(date) FROM source.comparisons
     )
 ''')
 
-cursor.execute('CREATE INDEX current_comparisons__variant_name ON current_comparisons (variant_name)')
+cursor.execute('CREATE INDEX current_comparisons__submission1 ON current_comparisons (submission1)')
+cursor.execute('CREATE INDEX current_comparisons__variant ON current_comparisons (variant)')
 cursor.execute('CREATE INDEX current_comparisons__gene ON current_comparisons (gene)')
 cursor.execute('CREATE INDEX current_comparisons__gene_type ON current_comparisons (gene_type)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_gene ON current_comparisons (normalized_gene)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_gene_type ON current_comparisons (normalized_gene_type)')
 cursor.execute('CREATE INDEX current_comparisons__submitter1_id ON current_comparisons (submitter1_id)')
-cursor.execute('CREATE INDEX current_comparisons__submitter1_name ON current_comparisons (submitter1_name)')
-cursor.execute('CREATE INDEX current_comparisons__submitter1_country_code ON current_comparisons (submitter1_country_code)')
-cursor.execute('CREATE INDEX current_comparisons__scv1 ON current_comparisons(scv1)')
 cursor.execute('CREATE INDEX current_comparisons__significance1 ON current_comparisons (significance1)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_significance1 ON current_comparisons (normalized_significance1)')
 cursor.execute('CREATE INDEX current_comparisons__star_level1 ON current_comparisons (star_level1)')
-cursor.execute('CREATE INDEX current_comparisons__condition1_name ON current_comparisons (condition1_name)')
-cursor.execute('CREATE INDEX current_comparisons__method1 ON current_comparisons (method1)')
+cursor.execute('CREATE INDEX current_comparisons__condition1 ON current_comparisons (condition1)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_method1 ON current_comparisons (normalized_method1)')
 cursor.execute('CREATE INDEX current_comparisons__submitter2_id ON current_comparisons (submitter2_id)')
 cursor.execute('CREATE INDEX current_comparisons__significance2 ON current_comparisons (significance2)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_significance2 ON current_comparisons (normalized_significance2)')
 cursor.execute('CREATE INDEX current_comparisons__star_level2 ON current_comparisons (star_level2)')
 cursor.execute('CREATE INDEX current_comparisons__normalized_method2 ON current_comparisons (normalized_method2)')
-cursor.execute('CREATE INDEX current_comparisons__condition2_name ON current_comparisons (condition2_name)')
+cursor.execute('CREATE INDEX current_comparisons__condition2 ON current_comparisons (condition2)')
 cursor.execute('CREATE INDEX current_comparisons__conflict_level ON current_comparisons (conflict_level)')
 
-def create_gene_links_table(normalized):
-    if normalized:
-        table = 'normalized_gene_links'
-        gene_column = 'normalized_gene'
-        type_column = 'normalized_gene_type'
-    else:
-        table = 'gene_links'
-        gene_column = 'gene'
-        type_column = 'gene_type'
-
-    cursor.execute('DROP TABLE IF EXISTS ' + table)
-
-    cursor.execute('CREATE TABLE ' + table + ' (gene TEXT, see_also TEXT)')
-
-    gene_combinations = list(map(
-        lambda row: row[0],
-        cursor.execute('SELECT DISTINCT ' + gene_column + ' FROM current_submissions WHERE ' + type_column + '=2')
-    ))
-    for gene_combination in gene_combinations:
-        for individual_gene in gene_combination.split(', '):
-            is_gene = bool(list(cursor.execute(
-                'SELECT 1 FROM current_submissions WHERE ' + gene_column + '=? LIMIT 1', [individual_gene]
-            )))
-            if is_gene:
-                cursor.executemany(
-                    'INSERT INTO ' + table + ' VALUES (?,?)',
-                    [[gene_combination, individual_gene], [individual_gene, gene_combination]]
-                )
-
-    cursor.execute('CREATE INDEX ' + table + '__gene ON ' + table + ' (gene)')
-
-create_gene_links_table(True)
-create_gene_links_table(False)
+#the highest conflict level of each submission with any submission of at least 0 to 4 stars, which answers every query
+#that asks nothing of the second submission of a pair except its stars without going through every pair
+star_levels = range(0, 5)
+cursor.execute(
+    'CREATE TABLE current_max_conflict_levels (submission INTEGER PRIMARY KEY, ' +
+    ', '.join(map(lambda star_level: 'max_conflict_level' + str(star_level) + ' INTEGER', star_levels)) + ')'
+)
+cursor.execute(
+    'INSERT INTO current_max_conflict_levels SELECT submission1, ' +
+    ', '.join(map(
+        lambda star_level: 'MAX(CASE WHEN star_level2>=' + str(star_level) + ' THEN conflict_level END)', star_levels
+    )) +
+    ' FROM current_comparisons GROUP BY submission1'
+)
+
+#the pages that count or list variants only need to know whether some pair of each variant matches their filters, so
+#one row per variant and combination of the other columns that they filter and group by stands in for all of its pairs
+cursor.execute('''
+    CREATE TABLE current_variant_comparisons AS
+    SELECT DISTINCT
+        variant,
+        gene,
+        gene_type,
+        normalized_gene,
+        normalized_gene_type,
+        star_level1,
+        condition1,
+        normalized_method1,
+        star_level2,
+        normalized_method2,
+        conflict_level
+    FROM current_comparisons
+''')
+
+cursor.execute('CREATE INDEX current_variant_comparisons__variant ON current_variant_comparisons (variant)')
+cursor.execute('CREATE INDEX current_variant_comparisons__gene ON current_variant_comparisons (gene)')
+cursor.execute('CREATE INDEX current_variant_comparisons__normalized_gene ON current_variant_comparisons (normalized_gene)')
+cursor.execute('CREATE INDEX current_variant_comparisons__condition1 ON current_variant_comparisons (condition1)')
+cursor.execute('CREATE INDEX current_variant_comparisons__conflict_level ON current_variant_comparisons (conflict_level)')
+
+#copy the names that the current release refers to, so that a name is in a current dimension table only if it is in use
+current_dimensions = [
+    ('variants', 'id, name', ['variant']),
+    ('genes', 'id, name', ['gene', 'normalized_gene']),
+    ('submitters', 'id, name, country_code, country_name', ['submitter_id']),
+    ('conditions', 'id, name, xrefs', ['condition']),
+    ('significances', 'id, name', ['significance', 'normalized_significance']),
+    ('review_statuses', 'id, name', ['review_status']),
+    ('methods', 'id, name', ['method', 'normalized_method']),
+]
+
+for dimension, columns, key_columns in current_dimensions:
+    cursor.execute(
+        'CREATE TABLE current_' + dimension + ' (' + columns.replace('id,', 'id INTEGER PRIMARY KEY,') + ')'
+    )
+    cursor.execute(
+        'INSERT INTO current_' + dimension + ' SELECT ' + columns + ' FROM source.' + dimension + ' WHERE id IN (' +
+        ' UNION '.join(map(lambda column: 'SELECT ' + column + ' FROM current_submissions', key_columns)) + ')'
+    )
+    cursor.execute('CREATE INDEX current_' + dimension + '__name ON current_' + dimension + ' (name)')
+
+cursor.execute('CREATE INDEX current_submitters__country_code ON current_submitters (country_code)')
+
+def create_gene_links_tables():
+    #one pass over the distinct genes of the current release finds the combinations and the genes in use for both tables
+    genes = {'gene': set(), 'normalized_gene': set()}
+    gene_combinations = {'gene': set(), 'normalized_gene': set()}
+    for gene, gene_type, normalized_gene, normalized_gene_type in list(cursor.execute('''
+        SELECT DISTINCT genes.name, gene_type, normalized_genes.name, normalized_gene_type
+        FROM current_submissions
+        JOIN current_genes AS genes ON genes.id=current_submissions.gene
+        JOIN current_genes AS normalized_genes ON normalized_genes.id=current_submissions.normalized_gene
+    ''')):
+        genes['gene'].add(gene)
+        genes['normalized_gene'].add(normalized_gene)
+        if gene_type == 2:
+            gene_combinations['gene'].add(gene)
+        if normalized_gene_type == 2:
+            gene_combinations['normalized_gene'].add(normalized_gene)
+
+    for table, gene_column in [('normalized_gene_links', 'normalized_gene'), ('gene_links', 'gene')]:
+        cursor.execute('CREATE TABLE ' + table + ' (gene TEXT, see_also TEXT)')
+
+        links = []
+        for gene_combination in sorted(gene_combinations[gene_column]):
+            for individual_gene in gene_combination.split(', '):
+                if individual_gene in genes[gene_column]:
+                    links += [[gene_combination, individual_gene], [individual_gene, gene_combination]]
+        cursor.executemany('INSERT INTO ' + table + ' VALUES (?,?)', links)
+
+        cursor.execute('CREATE INDEX ' + table + '__gene ON ' + table + ' (gene)')
+
+create_gene_links_tables()
+
+def create_totals_tables():
+    #the listing pages filter both submissions of each pair by the same number of stars, so count each gene, condition,
+    #submitter and significance at every combination of that and the conflict level
+    conflict_levels = ' UNION ALL '.join(map(lambda level: 'SELECT ' + str(level) + ' AS conflict_level', range(-1, 6)))
+    genes = ('normalized_gene', 'gene_count')
+    conditions = ('condition', 'condition_count')
+    submitters = ('submitter_id', 'submitter_count')
+    for table, key_column, source_column, counts in [
+        ('current_gene_totals', 'normalized_gene', 'normalized_gene', [conditions, submitters]),
+        ('current_condition_totals', 'condition1', 'condition', [genes, submitters]),
+        ('current_submitter_totals', 'submitter_id', 'submitter_id', [genes, conditions]),
+        (
+            'current_significance_totals', 'normalized_significance1', 'normalized_significance',
+            [genes, conditions, submitters]
+        ),
+    ]:
+        cursor.execute(
+            'CREATE TABLE ' + table + ' (min_stars INTEGER, min_conflict_level INTEGER, ' + key_column + ' INTEGER, ' +
+            ''.join(map(lambda count: count[1] + ' INTEGER, ', counts)) + 'count INTEGER)'
+        )
+        for star_level in star_levels:
+            cursor.execute(
+                'INSERT INTO ' + table + ' SELECT ' + str(star_level) + ', conflict_level, ' + source_column + ', ' +
+                ''.join(map(lambda count: 'COUNT(DISTINCT ' + count[0] + '), ', counts)) + 'COUNT(DISTINCT variant) ' +
+                'FROM current_submissions ' +
+                'JOIN current_max_conflict_levels ON current_max_conflict_levels.submission=current_submissions.id ' +
+                'JOIN (' + conflict_levels + ') AS conflict_levels ' +
+                'ON max_conflict_level' + str(star_level) + '>=conflict_levels.conflict_level ' +
+                'WHERE star_level>=' + str(star_level) + ' GROUP BY conflict_levels.conflict_level, ' + source_column
+            )
+        cursor.execute(
+            'CREATE INDEX ' + table + '__min_stars ON ' + table + ' (min_stars, min_conflict_level, ' + key_column + ')'
+        )
+
+create_totals_tables()
+
+def create_submitter_pair_tables():
+    #the conflict pages of a submitter compare it with every submitter that it shares a variant with, so count what each
+    #pair of submitters has in common, and what each submitter has in common with anyone in the rows where submitter2_id
+    #is NULL, at every number of stars on both sides of the pairs and no other filters
+    conflict_levels = ' UNION ALL '.join(map(lambda level: 'SELECT ' + str(level) + ' AS conflict_level', range(-1, 6)))
+    cursor.execute('''
+        CREATE TABLE current_submitter_pair_totals (
+            min_stars INTEGER,
+            min_conflict_level INTEGER,
+            submitter1_id INTEGER,
+            submitter2_id INTEGER,
+            gene_count INTEGER,
+            condition_count INTEGER,
+            count INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE current_submitter_pair_conflict_levels (
+            min_stars INTEGER,
+            submitter1_id INTEGER,
+            submitter2_id INTEGER,
+            conflict_level INTEGER,
+            count INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE current_submitter_pair_significances (
+            min_stars INTEGER,
+            submitter1_id INTEGER,
+            submitter2_id INTEGER,
+            significance1 INTEGER,
+            significance2 INTEGER,
+            conflict_level INTEGER,
+            count INTEGER
+        )
+    ''')
+
+    for star_level in star_levels:
+        stars = 'star_level1>=' + str(star_level) + ' AND star_level2>=' + str(star_level)
+
+        #a gene, condition or variant counts at a conflict level if any of its pairs reaches it
+        cursor.execute(
+            'WITH pair_variants AS (' +
+            'SELECT submitter1_id, submitter2_id, variant, normalized_gene, condition1, ' +
+            'MAX(conflict_level) AS max_conflict_level FROM current_comparisons WHERE ' + stars + ' ' +
+            'GROUP BY submitter1_id, submitter2_id, variant, normalized_gene, condition1) ' +
+            'INSERT INTO current_submitter_pair_totals ' +
+            ' UNION ALL '.join(map(
+                lambda submitter2_id: (
+                    'SELECT ' + str(star_level) + ', conflict_levels.conflict_level, submitter1_id, ' + submitter2_id +
+                    ', COUNT(DISTINCT normalized_gene), COUNT(DISTINCT condition1), COUNT(DISTINCT variant) ' +
+                    'FROM pair_variants JOIN (' + conflict_levels + ') AS conflict_levels ' +
+                    'ON max_conflict_level>=conflict_levels.conflict_level ' +
+                    'GROUP BY conflict_levels.conflict_level, submitter1_id, ' + submitter2_id
+                ),
+                ['submitter2_id', 'NULL']
+            ))
+        )
+
+        #only conflicts are broken down by level and significance, which is all that the conflict pages show
+        for submitter2_id in ['submitter2_id', 'NULL']:
+            cursor.execute(
+                'INSERT INTO current_submitter_pair_conflict_levels ' +
+                'SELECT ' + str(star_level) + ', submitter1_id, ' + submitter2_id + ', conflict_level, ' +
+                'COUNT(DISTINCT variant) FROM current_comparisons WHERE ' + stars + ' AND conflict_level>=1 ' +
+                'GROUP BY submitter1_id, ' + submitter2_id + ', conflict_level'
+            )
+            cursor.execute(
+                'INSERT INTO current_submitter_pair_significances ' +
+                'SELECT ' + str(star_level) + ', submitter1_id, ' + submitter2_id + ', ' +
+                'normalized_significance1, normalized_significance2, conflict_level, ' +
+                'COUNT(DISTINCT variant) FROM current_comparisons WHERE ' + stars + ' AND conflict_level>=1 ' +
+                'GROUP BY submitter1_id, ' + submitter2_id + ', normalized_significance1, normalized_significance2, ' +
+                'conflict_level'
+            )
+
+    for table in [
+        'current_submitter_pair_totals',
+        'current_submitter_pair_conflict_levels',
+        'current_submitter_pair_significances',
+    ]:
+        cursor.execute(
+            'CREATE INDEX ' + table + '__min_stars ON ' + table + ' (min_stars, submitter1_id, submitter2_id)'
+        )
+
+create_submitter_pair_tables()
 
 db.commit()
 db.close()
+
+#renaming is atomic, and connections that are still open keep reading the old file until they are closed
+rename('current.db.part', 'current.db')
+
+#older versions kept these tables in the main database, where they would hide the new ones
+db = importer.connect()
+for table in list(map(lambda row: row[0], db.execute('SELECT name FROM sqlite_master WHERE type=\'table\''))):
+    if table.startswith('current_') or table.endswith('gene_links'):
+        db.execute('DROP TABLE ' + table)
+db.close()
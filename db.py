@@ -1,69 +1,384 @@
+import json
 import sqlite3
 from asynchelper import promise
+from collections import OrderedDict
+from concurrent.futures import Future
+from flask import g, has_request_context
+from functools import wraps
+from glob import glob
+from os import environ, stat
+from queue import Empty, Full, LifoQueue
 from sqlite3 import OperationalError
+from threading import Lock
+
+#connections are kept open between queries so that their page caches stay warm
+idle_connections = LifoQueue(int(environ.get('DB_CONNECTIONS', 16)))
+
+#results of recent queries, shared by every page and weighed by their number of rows
+query_cache = OrderedDict()
+query_cache_lock = Lock()
+query_cache_rows = int(environ.get('QUERY_CACHE_ROWS', 200000))
+query_cache_stats = {'hits': 0, 'misses': 0, 'rows': 0}
+
+class MissingReleaseError(Exception):
+    pass
+
+def get_release():
+    #create-current-tables.py swaps in a new current.db by renaming it over the old one, which changes the inode; there
+    #is no release until it has run for the first time
+    try:
+        release = stat('current.db')
+    except FileNotFoundError:
+        return None
+    return (release.st_dev, release.st_ino, release.st_mtime_ns)
+
+def connect():
+    release = get_release()
+    if not release:
+        raise MissingReleaseError('current.db does not exist yet. Run ./create-current-tables.py to build it.')
+    db = sqlite3.connect('file:clinvar.db?mode=ro', uri=True, timeout=20, check_same_thread=False)
+    db.execute('ATTACH DATABASE \'file:current.db?mode=ro\' AS current')
+    db.execute('PRAGMA query_only=ON')
+    db.row_factory = sqlite3.Row
+    return (db, release)
+
+def check_out():
+    try:
+        connection = idle_connections.get_nowait()
+    except Empty:
+        return connect()
+
+    db, release = connection
+    try:
+        if release == get_release():
+            db.execute('SELECT 1')
+            return connection
+    except sqlite3.Error:
+        pass
+    db.close()
+    return connect()
+
+def check_in(connection):
+    try:
+        idle_connections.put_nowait(connection)
+    except Full:
+        connection[0].close()
+
+def result_rows(result):
+    if isinstance(result, list):
+        return len(result) or 1
+    if isinstance(result, dict):
+        return sum(map(result_rows, result.values())) or 1
+    return 1
+
+def evict_results():
+    #called with the lock held
+    while query_cache_stats['rows'] > query_cache_rows and len(query_cache) > 1:
+        result, rows = query_cache.popitem(last=False)[1]
+        query_cache_stats['rows'] -= rows
+
+def cache_result(key, result):
+    with query_cache_lock:
+        #a new current.db makes every result of the old one unreachable, so drop them all at once
+        if query_cache and next(reversed(query_cache))[2] != key[2]:
+            query_cache.clear()
+            query_cache_stats['rows'] = 0
+        query_cache[key] = [result, 1]
+        query_cache_stats['rows'] += 1
+        evict_results()
+
+    if isinstance(result, Future):
+        #a promise is cached right away so that other pages can wait on it too, and weighed once it is fulfilled
+        def weigh(future):
+            with query_cache_lock:
+                entry = query_cache.get(key)
+                if not entry or entry[0] is not future:
+                    return
+                if future.exception():
+                    del query_cache[key]
+                    query_cache_stats['rows'] -= entry[1]
+                    return
+                rows = result_rows(future.result())
+                query_cache_stats['rows'] += rows - entry[1]
+                entry[1] = rows
+                evict_results()
+        result.add_done_callback(weigh)
+
+def get_cached_result(key):
+    with query_cache_lock:
+        entry = query_cache.get(key)
+        if entry:
+            query_cache.move_to_end(key)
+            query_cache_stats['hits'] += 1
+        else:
+            query_cache_stats['misses'] += 1
+        return entry
+
+def memoize(fn):
+    #the same aggregates appear on many pages, so keep their rows, or the promise of them, until the release changes;
+    #every page gets the same lists and dicts, so a page that needs to change a result has to copy it first
+    @wraps(fn)
+    def memoized(self, *args, **kwargs):
+        key = (fn.__name__, json.dumps([args, kwargs], sort_keys=True), self.connection[1])
+
+        #a page that asks the same question twice gets the same answer even if it was evicted in between
+        if has_request_context():
+            if 'query_results' not in g:
+                g.query_results = {}
+                g.query_cache_hits = 0
+            if key in g.query_results:
+                return g.query_results[key]
+
+        entry = get_cached_result(key)
+        if entry:
+            result = entry[0]
+            if has_request_context():
+                g.query_cache_hits += 1
+        else:
+            result = fn(self, *args, **kwargs)
+            cache_result(key, result)
+
+        if has_request_context():
+            g.query_results[key] = result
+        return result
+    return memoized
+
+def query_cache_timing():
+    #how many of the request's queries were answered by the query cache
+    if 'query_results' not in g:
+        return None
+    return (
+        'query-cache;desc="' + str(g.query_cache_hits) + ' of ' + str(len(g.query_results)) + ' queries cached, ' +
+        str(query_cache_stats['hits']) + ' hits and ' + str(query_cache_stats['misses']) + ' misses since start"'
+    )
 
 class DB():
+    #columns that hold keys of a dimension table instead of names
+    dimensions = {
+        'variant': 'current_variants',
+        'gene': 'current_genes',
+        'normalized_gene': 'current_genes',
+        'condition1': 'current_conditions',
+        'condition2': 'current_conditions',
+        'significance1': 'current_significances',
+        'significance2': 'current_significances',
+        'normalized_significance1': 'current_significances',
+        'normalized_significance2': 'current_significances',
+        'normalized_method1': 'current_methods',
+        'normalized_method2': 'current_methods',
+    }
+
     def __init__(self):
-        self.db = sqlite3.connect('clinvar.db', timeout=20, check_same_thread=False)
-        self.db.row_factory = sqlite3.Row
+        self.connection = check_out()
+        self.db = self.connection[0]
         self.cursor = self.db.cursor()
 
+    def __del__(self):
+        #each DB object is used for one query, so return its connection as soon as the object goes away
+        if hasattr(self, 'connection'):
+            check_in(self.connection)
+
     def and_equals(self, column, value):
         if type(value) == list:
             if not value:
                 return
-            db_types = {
-                int: 'INTEGER',
-                str: 'TEXT',
-            }
-            self.cursor.execute('DROP TABLE IF EXISTS ' + column) #the same connection may perform multiple queries
-            self.cursor.execute('CREATE TEMP TABLE ' + column + ' (value ' + db_types[type(value[0])] + ')')
-            self.cursor.execute('CREATE INDEX ' + column + '__value ON ' + column + ' (value)')
-            self.cursor.executemany('INSERT INTO ' + column + ' VALUES (?)', map(lambda value: [value], value))
-            self.query += ' AND ' + column + ' IN (SELECT value FROM ' + column + ')'
+            #bind the whole list as one JSON parameter so that no temporary table is needed
+            if column in self.dimensions:
+                self.query += (
+                    ' AND ' + column + ' IN (SELECT id FROM ' + self.dimensions[column] +
+                    ' WHERE name IN (SELECT value FROM json_each(:' + column + ')))'
+                )
+            else:
+                self.query += ' AND ' + column + ' IN (SELECT value FROM json_each(:' + column + '))'
+            self.parameters[column] = json.dumps(value)
         else:
-            self.query += ' AND ' + column + '=:' + column
+            if column in self.dimensions:
+                self.query += (
+                    ' AND ' + column + '=(SELECT id FROM ' + self.dimensions[column] + ' WHERE name=:' + column + ')'
+                )
+            else:
+                self.query += ' AND ' + column + '=:' + column
             self.parameters[column] = value
 
     def rows(self):
         return list(map(dict, self.cursor.execute(self.query, self.parameters)))
 
+    def historical_rows(self, query, parameters = {}):
+        #releases imported with --shards are in their own databases, one per month, and take precedence
+        shard_rows = []
+        for shard_filename in sorted(glob('shards/*.db')):
+            shard = sqlite3.connect('file:' + shard_filename + '?mode=ro', uri=True, timeout=20)
+            shard.row_factory = sqlite3.Row
+            shard_rows += list(map(dict, shard.execute(query, parameters)))
+            shard.close()
+
+        shard_dates = set(map(lambda row: row.get('date'), shard_rows)) - {None}
+        return [
+            row for row in map(dict, self.cursor.execute(query, parameters))
+            if row.get('date') not in shard_dates
+        ] + shard_rows
+
     def value(self):
         return list(self.cursor.execute(self.query, self.parameters))[0][0]
 
+    def counts_at_conflict_levels(self, counts, min_conflict_levels):
+        #count each column once per threshold with the rows below it masked out, so that one scan of the lowest
+        #threshold answers all of them
+        self.parameters['min_conflict_level'] = min(min_conflict_levels)
+        columns = []
+        for i, min_conflict_level in enumerate(min_conflict_levels):
+            self.parameters['min_conflict_level' + str(i)] = min_conflict_level
+            for column, alias in counts:
+                columns.append(
+                    'COUNT(DISTINCT CASE WHEN conflict_level>=:min_conflict_level' + str(i) + ' THEN ' + column + ' END)' +
+                    ' AS ' + alias + str(i)
+                )
+        return ', '.join(columns)
+
+    def rows_at_conflict_levels(self, names, aliases, min_conflict_levels):
+        #split the fused rows back into the rows that each threshold would have returned by itself
+        rows = self.rows()
+        rows_by_level = {}
+        for i, min_conflict_level in enumerate(min_conflict_levels):
+            level_rows = []
+            for row in rows:
+                if row['count' + str(i)]:
+                    level_row = {name: row[name] for name in names}
+                    for alias in aliases:
+                        level_row[alias] = row[alias + str(i)]
+                    level_rows.append(level_row)
+            level_rows.sort(key=lambda row: row['count'], reverse=True)
+            rows_by_level[min_conflict_level] = level_rows
+        return rows_by_level
+
+    def comparisons(self, kwargs, pairwise = False, variants_only = False):
+        #every submission is compared to itself, and current_max_conflict_levels knows how far each submission's other
+        #comparisons go at each number of stars, so unless a query asks more of the second submission of a pair than its
+        #stars, the submissions alone give the same distinct counts as all of the pairs
+        min_stars2 = max(kwargs.get('min_stars2', 0), 0)
+        if (
+            pairwise or
+            min_stars2 > 4 or
+            kwargs.get('normalized_method2') or
+            kwargs.get('submitter2_id') or
+            kwargs.get('significance2')
+        ):
+            #a query that only counts or lists variants just needs to know whether any pair of each variant matches, so
+            #unless it filters by who submitted what, current_variant_comparisons holds every combination that matters
+            if variants_only and not (
+                kwargs.get('submitter1_id') or
+                kwargs.get('submitter2_id') or
+                kwargs.get('significance1') or
+                kwargs.get('significance2')
+            ):
+                return 'current_variant_comparisons'
+            return 'current_comparisons'
+
+        #the stars of the second submission are already accounted for by the choice of conflict level column
+        return '''(
+            SELECT
+                date,
+                id AS submission1,
+                variant,
+                gene,
+                gene_type,
+                normalized_gene,
+                normalized_gene_type,
+                submitter_id AS submitter1_id,
+                significance AS significance1,
+                normalized_significance AS normalized_significance1,
+                star_level AS star_level1,
+                condition AS condition1,
+                normalized_method AS normalized_method1,
+                4 AS star_level2,
+                max_conflict_level''' + str(min_stars2) + ''' AS conflict_level
+            FROM current_submissions
+            JOIN current_max_conflict_levels ON current_max_conflict_levels.submission=current_submissions.id
+        ) AS current_comparisons'''
+
+    def totals_min_stars(self, kwargs, other_filters):
+        #the totals tables hold queries that filter both submissions of each pair by the same number of stars and by
+        #nothing else but the conflict level and the column that they group by
+        min_stars = max(kwargs.get('min_stars1', 0), 0)
+        if (
+            min_stars != max(kwargs.get('min_stars2', 0), 0) or
+            min_stars > 4 or
+            kwargs.get('normalized_method1') or
+            kwargs.get('normalized_method2') or
+            kwargs.get('gene_type', -1) != -1 or
+            kwargs.get('original_genes') or
+            kwargs.get('original_terms') or
+            any(map(lambda name: kwargs.get(name) not in [None, []], other_filters))
+        ):
+            return None
+        return min_stars
+
+    def totals_at_conflict_levels(self, min_conflict_levels):
+        #split the rows of a totals table by the conflict level that they were counted at
+        rows = self.rows()
+        rows_by_level = {}
+        for min_conflict_level in min_conflict_levels:
+            rows_by_level[min_conflict_level] = [
+                {name: row[name] for name in row if name != 'min_conflict_level'}
+                for row in rows if row['min_conflict_level'] == max(min_conflict_level, -1)
+            ]
+        return rows_by_level
+
+    def submitter_pair_min_stars(self, kwargs, other_filters):
+        #the submitter pair tables count what one submitter has in common with another, or with anyone, under the same
+        #filters as the totals tables
+        if type(kwargs.get('submitter1_id')) is not int or type(kwargs.get('submitter2_id') or 0) is not int:
+            return None
+        return self.totals_min_stars(kwargs, other_filters)
+
+    def and_submitter_pair(self, kwargs):
+        #submitter2_id is NULL in the rows that compare a submitter with anyone
+        self.query += ' AND submitter1_id=:submitter1_id AND submitter2_id IS :submitter2_id'
+        self.parameters['submitter1_id'] = kwargs['submitter1_id']
+        self.parameters['submitter2_id'] = kwargs.get('submitter2_id') or None
+
     def condition_xrefs(self, condition_name):
         try:
-            #prefer a row that has cross-references
-            return list(self.cursor.execute('''
-                SELECT DISTINCT condition_xrefs FROM current_submissions WHERE condition_name=?
-                ORDER BY condition_xrefs=='' LIMIT 1
-            ''', [condition_name]))[0][0].split(';')
+            #the importer keeps the cross-references if any submission has them
+            return list(self.cursor.execute(
+                'SELECT xrefs FROM current_conditions WHERE name=?', [condition_name]
+            ))[0][0].split(';')
         except IndexError:
             return None
 
+    @memoize
     def country_name(self, country_code):
         try:
             return list(self.cursor.execute(
-                'SELECT submitter_country_name FROM current_submissions WHERE submitter_country_code=? LIMIT 1',
-                [country_code]
+                'SELECT country_name FROM current_submitters WHERE country_code=? LIMIT 1', [country_code]
             ))[0][0]
         except IndexError:
             return None
 
+    @memoize
     def gene_from_rsid(self, rsid):
         try:
-            return list(self.cursor.execute(
-                'SELECT DISTINCT gene FROM current_submissions WHERE rsid=? LIMIT 1', [rsid]
-            ))[0][0]
+            return list(self.cursor.execute('''
+                SELECT DISTINCT current_genes.name FROM current_submissions
+                JOIN current_genes ON current_genes.id=current_submissions.gene
+                WHERE rsid=? LIMIT 1
+            ''', [rsid]))[0][0]
         except IndexError:
             return None
 
+    @memoize
     def gene_info(self, gene, original_genes = False):
         try:
             if original_genes:
-                query = 'SELECT gene_type FROM current_submissions WHERE gene=? LIMIT 1'
+                query = '''
+                    SELECT gene_type FROM current_submissions
+                    WHERE gene=(SELECT id FROM current_genes WHERE name=?) LIMIT 1
+                '''
             else:
-                query = 'SELECT normalized_gene_type FROM current_submissions WHERE normalized_gene=? LIMIT 1'
+                query = '''
+                    SELECT normalized_gene_type FROM current_submissions
+                    WHERE normalized_gene=(SELECT id FROM current_genes WHERE name=?) LIMIT 1
+                '''
             ret = {'name': gene, 'type': list(self.cursor.execute(query, [gene]))[0][0]}
         except IndexError:
             return None
@@ -76,53 +391,62 @@ class DB():
 
         return ret
 
+    @memoize
     def is_gene(self, gene):
         return bool(list(self.cursor.execute(
-            'SELECT 1 FROM current_submissions WHERE gene=? OR normalized_gene=? LIMIT 1', [gene, gene]
+            'SELECT 1 FROM current_genes WHERE name=? LIMIT 1', [gene]
         )))
 
+    @memoize
     def is_condition_name(self, condition_name):
         return bool(list(self.cursor.execute(
-            'SELECT 1 FROM current_submissions WHERE condition_name=? LIMIT 1', [condition_name]
+            'SELECT 1 FROM current_conditions WHERE name=? LIMIT 1', [condition_name]
         )))
 
+    @memoize
     def is_significance(self, significance):
+        #the significance dimension also holds normalized terms, which do not count here
         return bool(list(self.cursor.execute(
-            'SELECT 1 FROM current_submissions WHERE significance=? LIMIT 1', [significance]
+            'SELECT 1 FROM current_submissions WHERE significance=(SELECT id FROM current_significances WHERE name=?) LIMIT 1',
+            [significance]
         )))
 
+    @memoize
     def is_variant_name(self, variant_name):
         return bool(list(self.cursor.execute(
-            'SELECT 1 FROM current_submissions WHERE variant_name=? LIMIT 1', [variant_name]
+            'SELECT 1 FROM current_variants WHERE name=? LIMIT 1', [variant_name]
         )))
 
+    @memoize
     def max_date(self):
         return list(self.cursor.execute('SELECT date FROM current_submissions LIMIT 1'))[0][0]
 
     def significance_term_info(self):
-        return list(map(
-            dict,
-            self.cursor.execute('''
-                SELECT significance, MIN(date) AS first_seen, MAX(date) AS last_seen FROM submissions
-                GROUP BY significance ORDER BY last_seen DESC, first_seen DESC
-            ''')
-        ))
+        info = {}
+        for row in self.historical_rows('''
+            SELECT significances.name AS significance, first_seen, last_seen FROM (
+                SELECT significance, MIN(date) AS first_seen, MAX(date) AS last_seen FROM monthly_significance_totals
+                GROUP BY significance
+            ) AS terms
+            JOIN significances ON significances.id=terms.significance
+        '''):
+            significance = row['significance']
+            if significance in info:
+                info[significance]['first_seen'] = min(info[significance]['first_seen'], row['first_seen'])
+                info[significance]['last_seen'] = max(info[significance]['last_seen'], row['last_seen'])
+            else:
+                info[significance] = row
+        return sorted(info.values(), key=lambda row: (row['last_seen'], row['first_seen']), reverse=True)
 
+    @memoize
     def submissions(self, **kwargs):
+        #the star and method filters apply to both submissions of each pair
+        comparisons = self.comparisons(
+            dict(kwargs, min_stars2=kwargs.get('min_stars', 0)), kwargs.get('normalized_method')
+        )
+
         self.query = '''
-            SELECT
-                variant_name,
-                submitter1_id AS submitter_id,
-                submitter1_name AS submitter_name,
-                rcv1 AS rcv,
-                scv1 AS scv,
-                significance1 AS significance,
-                last_eval1 AS last_eval,
-                review_status1 AS review_status,
-                condition1_name AS condition_name,
-                method1 AS method,
-                comment1 AS comment
-            FROM current_comparisons
+            SELECT submission1 FROM ''' + comparisons + '''
             WHERE star_level1>=:min_stars AND star_level2>=:min_stars AND conflict_level>=:min_conflict_level
         '''
 
@@ -132,46 +456,74 @@ class DB():
         }
 
         if kwargs.get('variant_name'):
-            self.and_equals('variant_name', kwargs['variant_name'])
+            self.and_equals('variant', kwargs['variant_name'])
 
         if kwargs.get('normalized_method'):
             self.and_equals('normalized_method1', kwargs['normalized_method'])
             self.and_equals('normalized_method2', kwargs['normalized_method'])
 
-        self.query += ' GROUP BY scv1 ORDER BY submitter_name'
+        self.query += ' GROUP BY submission1'
+
+        self.query = '''
+            SELECT
+                current_variants.name AS variant_name,
+                current_submissions.submitter_id,
+                current_submitters.name AS submitter_name,
+                current_submissions.rcv,
+                current_submissions.scv,
+                current_significances.name AS significance,
+                current_submissions.last_eval,
+                current_review_statuses.name AS review_status,
+                current_conditions.name AS condition_name,
+                current_methods.name AS method,
+                current_submissions.comment
+            FROM (''' + self.query + ''') AS submission_keys
+            JOIN current_submissions ON current_submissions.id=submission_keys.submission1
+            JOIN current_variants ON current_variants.id=current_submissions.variant
+            JOIN current_submitters ON current_submitters.id=current_submissions.submitter_id
+            JOIN current_significances ON current_significances.id=current_submissions.significance
+            JOIN current_review_statuses ON current_review_statuses.id=current_submissions.review_status
+            JOIN current_conditions ON current_conditions.id=current_submissions.condition
+            JOIN current_methods ON current_methods.id=current_submissions.method
+            ORDER BY submitter_name
+        '''
 
         return self.rows()
 
+    @memoize
     def submitter_id_from_name(self, submitter_name):
         try:
             return list(self.cursor.execute(
-                'SELECT submitter_id FROM current_submissions WHERE submitter_name=? LIMIT 1', [submitter_name]
+                'SELECT id FROM current_submitters WHERE name=? LIMIT 1', [submitter_name]
             ))[0][0]
         except IndexError:
             return None
 
+    @memoize
     def submitter_info(self, submitter_id):
         try:
-            row = list(self.cursor.execute('''
-                SELECT submitter_id, submitter_name, submitter_country_name
-                FROM current_submissions WHERE submitter_id=? LIMIT 1
-                ''', [submitter_id]
+            row = list(self.cursor.execute(
+                'SELECT id, name, country_name FROM current_submitters WHERE id=?', [submitter_id]
             ))[0]
             return {'id': row[0], 'name': row[1], 'country_name': row[2]}
         except IndexError:
             return None
 
+    @memoize
     def submitter_primary_method(self, submitter_id):
         return list(
             self.cursor.execute('''
-                SELECT method FROM current_submissions WHERE submitter_id=?
+                SELECT current_methods.name FROM current_submissions
+                JOIN current_methods ON current_methods.id=current_submissions.method
+                WHERE submitter_id=?
                 GROUP BY method ORDER BY COUNT(*) DESC LIMIT 1
             ''', [submitter_id])
         )[0][0]
 
+    @memoize
     def total_conditions(self, **kwargs):
         self.query = '''
-            SELECT COUNT(DISTINCT condition1_name) FROM current_comparisons
+            SELECT COUNT(DISTINCT condition1) FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -204,11 +556,12 @@ class DB():
 
         return self.value()
 
+    @memoize
     def total_genes(self, **kwargs):
         if kwargs.get('original_genes'):
-            self.query = 'SELECT COUNT(DISTINCT gene) FROM current_comparisons'
+            self.query = 'SELECT COUNT(DISTINCT gene) FROM ' + self.comparisons(kwargs)
         else:
-            self.query = 'SELECT COUNT(DISTINCT normalized_gene) FROM current_comparisons'
+            self.query = 'SELECT COUNT(DISTINCT normalized_gene) FROM ' + self.comparisons(kwargs)
 
         self.query += '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
@@ -221,7 +574,7 @@ class DB():
         }
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -242,17 +595,19 @@ class DB():
 
     @promise
     def total_significance_terms_over_time(self):
-        return list(map(
-            dict,
-            self.cursor.execute('SELECT date, COUNT(DISTINCT significance) AS count FROM submissions GROUP BY date')
-        ))
+        return sorted(
+            self.historical_rows('SELECT date, COUNT(*) AS count FROM monthly_significance_totals GROUP BY date'),
+            key=lambda row: row['date']
+        )
 
+    @memoize
     def total_submissions(self):
         return list(self.cursor.execute('SELECT COUNT(*) FROM current_submissions'))[0][0]
 
+    @memoize
     def total_submitters(self, **kwargs):
         self.query = '''
-            SELECT COUNT(DISTINCT submitter1_id) FROM current_comparisons
+            SELECT COUNT(DISTINCT submitter1_id) FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -269,7 +624,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('normalized_method1'):
             self.and_equals('normalized_method1', kwargs['normalized_method1'])
@@ -285,13 +640,16 @@ class DB():
 
         return self.value()
 
+    @memoize
     def total_submissions_by_country(self, **kwargs):
+        #the star and method filters apply to both submissions of each pair
+        comparisons = self.comparisons(
+            dict(kwargs, min_stars2=kwargs.get('min_stars', 0)), kwargs.get('normalized_method')
+        )
+
         self.query = '''
-            SELECT
-                submitter1_country_code AS country_code,
-                submitter1_country_name AS country_name,
-                COUNT(DISTINCT scv1) AS count
-            FROM current_comparisons
+            SELECT submitter1_id AS submitter_id, COUNT(DISTINCT submission1) AS count
+            FROM ''' + comparisons + '''
             WHERE star_level1>=:min_stars AND star_level2>=:min_stars AND conflict_level>=:min_conflict_level
         '''
 
@@ -304,19 +662,34 @@ class DB():
             self.and_equals('normalized_method1', kwargs['normalized_method'])
             self.and_equals('normalized_method2', kwargs['normalized_method'])
 
-        self.query += ' GROUP BY country_code ORDER BY count DESC'
+        self.query += ' GROUP BY submitter1_id'
+
+        #every submission has one submitter, so the totals of a country's submitters add up to the country's total
+        self.query = '''
+            SELECT country_code, country_name, SUM(count) AS count
+            FROM (''' + self.query + ''') AS submitter_totals
+            JOIN current_submitters ON current_submitters.id=submitter_totals.submitter_id
+            GROUP BY country_code ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
     def total_submissions_by_method(self, **kwargs):
+        #the star filter applies to both submissions of each pair
+        comparisons = self.comparisons(dict(kwargs, min_stars2=kwargs.get('min_stars', 0)))
+
         return list(map(
             dict,
             self.cursor.execute(
                 '''
-                    SELECT method1 AS method, COUNT(DISTINCT scv1) AS count
-                    FROM current_comparisons
-                    WHERE star_level1>=:min_stars AND star_level2>=:min_stars AND conflict_level>=:min_conflict_level
-                    GROUP BY method ORDER BY count DESC
+                    SELECT current_methods.name AS method, COUNT(*) AS count FROM (
+                        SELECT DISTINCT submission1 FROM ''' + comparisons + '''
+                        WHERE star_level1>=:min_stars AND star_level2>=:min_stars AND conflict_level>=:min_conflict_level
+                    ) AS submission_keys
+                    JOIN current_submissions ON current_submissions.id=submission_keys.submission1
+                    JOIN current_methods ON current_methods.id=current_submissions.method
+                    GROUP BY current_submissions.method ORDER BY count DESC
                 ''',
                 {
                     'min_stars': kwargs.get('min_stars', 0),
@@ -326,26 +699,28 @@ class DB():
         ))
 
     def total_submissions_by_normalized_method_over_time(self, **kwargs):
-        return list(map(
-            dict,
-            self.cursor.execute(
+        return sorted(
+            self.historical_rows(
                 '''
-                    SELECT date, normalized_method1 AS normalized_method, COUNT(DISTINCT scv1) AS count
-                    FROM comparisons
-                    WHERE star_level1>=:min_stars AND star_level2>=:min_stars AND conflict_level>=:min_conflict_level
-                    GROUP BY date, normalized_method ORDER BY date, count DESC
+                    SELECT date, methods.name AS normalized_method, count
+                    FROM monthly_method_totals JOIN methods ON methods.id=monthly_method_totals.normalized_method
+                    WHERE min_stars=:min_stars AND min_conflict_level=:min_conflict_level
                 ''',
                 {
-                    'min_stars': kwargs.get('min_stars', 0),
-                    'min_conflict_level': kwargs.get('min_conflict_level', -1),
+                    #the importer counts every threshold from the lowest up, so lower ones mean the same as the lowest
+                    'min_stars': max(kwargs.get('min_stars', 0), 0),
+                    'min_conflict_level': max(kwargs.get('min_conflict_level', -1), -1),
                 }
-            )
-        ))
+            ),
+            key=lambda row: (row['date'], -row['count'])
+        )
 
+    @memoize
     def total_submissions_by_submitter(self, **kwargs):
+        #the star filter applies only to the first submission of each pair
         self.query = '''
-            SELECT submitter1_id AS submitter_id, submitter1_name AS submitter_name, COUNT(DISTINCT scv1) AS count
-            FROM current_comparisons
+            SELECT submitter1_id AS submitter_id, COUNT(DISTINCT submission1) AS count
+            FROM ''' + self.comparisons(dict(kwargs, min_stars2=0)) + '''
             WHERE star_level1>=:min_stars AND conflict_level>=:min_conflict_level
         '''
 
@@ -355,18 +730,27 @@ class DB():
         }
 
         if kwargs.get('country_code'):
-            self.and_equals('submitter1_country_code', kwargs['country_code'])
+            self.query += ' AND submitter1_id IN (SELECT id FROM current_submitters WHERE country_code=:country_code)'
+            self.parameters['country_code'] = kwargs['country_code']
 
         if kwargs.get('normalized_method'):
             self.and_equals('normalized_method1', kwargs['normalized_method'])
 
-        self.query += ' GROUP BY submitter1_id ORDER BY count DESC'
+        self.query += ' GROUP BY submitter1_id'
+
+        self.query = '''
+            SELECT submitter_totals.submitter_id, current_submitters.name AS submitter_name, count
+            FROM (''' + self.query + ''') AS submitter_totals
+            JOIN current_submitters ON current_submitters.id=submitter_totals.submitter_id
+            ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
     def total_variants(self, **kwargs):
         self.query = '''
-            SELECT COUNT(DISTINCT variant_name) FROM current_comparisons
+            SELECT COUNT(DISTINCT variant) FROM ''' + self.comparisons(kwargs, variants_only=True) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -383,7 +767,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -411,12 +795,102 @@ class DB():
 
         return self.value()
 
+    @memoize
+    @promise
+    def total_variants_at_conflict_levels(self, **kwargs):
+        min_conflict_levels = kwargs['min_conflict_levels']
+
+        min_stars = self.submitter_pair_min_stars(kwargs, ['gene', 'condition1_name', 'significance1'])
+        if min_stars != None:
+            self.query = '''
+                SELECT min_conflict_level, count FROM current_submitter_pair_totals
+                WHERE min_stars=:min_stars AND min_conflict_level IN (SELECT value FROM json_each(:min_conflict_levels))
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_levels': json.dumps(list(map(lambda level: max(level, -1), min_conflict_levels))),
+            }
+            self.and_submitter_pair(kwargs)
+            counts = {row['min_conflict_level']: row['count'] for row in self.rows()}
+            return {
+                min_conflict_level: counts.get(max(min_conflict_level, -1), 0)
+                for min_conflict_level in min_conflict_levels
+            }
+
+        self.parameters = {
+            'min_stars1': kwargs.get('min_stars1', 0),
+            'min_stars2': kwargs.get('min_stars2', 0),
+        }
+
+        self.query = (
+            'SELECT ' + self.counts_at_conflict_levels([('variant', 'count')], min_conflict_levels) + '''
+            FROM ''' + self.comparisons(kwargs, variants_only=True) + '''
+            WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
+            '''
+        )
+
+        if kwargs.get('gene') != None:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene', kwargs['gene'])
+            else:
+                self.and_equals('normalized_gene', kwargs['gene'])
+
+        if kwargs.get('condition1_name'):
+            self.and_equals('condition1', kwargs['condition1_name'])
+
+        if kwargs.get('submitter1_id'):
+            self.and_equals('submitter1_id', kwargs['submitter1_id'])
+
+        if kwargs.get('submitter2_id'):
+            self.and_equals('submitter2_id', kwargs['submitter2_id'])
+
+        if kwargs.get('significance1'):
+            if kwargs.get('original_terms'):
+                self.and_equals('significance1', kwargs['significance1'])
+            else:
+                self.and_equals('normalized_significance1', kwargs['significance1'])
+
+        if kwargs.get('normalized_method1'):
+            self.and_equals('normalized_method1', kwargs['normalized_method1'])
+
+        if kwargs.get('normalized_method2'):
+            self.and_equals('normalized_method2', kwargs['normalized_method2'])
+
+        if kwargs.get('gene_type', -1) != -1:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene_type', kwargs['gene_type'])
+            else:
+                self.and_equals('normalized_gene_type', kwargs['gene_type'])
+
+        row = list(self.cursor.execute(self.query, self.parameters))[0]
+        return {min_conflict_level: row[i] for i, min_conflict_level in enumerate(min_conflict_levels)}
+
+    @memoize
     @promise
     def total_variants_by_condition(self, **kwargs):
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'submitter1_id', 'significance1'])
+        if min_stars != None and type(kwargs.get('condition1_name', [])) == list:
+            self.query = '''
+                SELECT current_conditions.name AS condition_name, gene_count, submitter_count, count
+                FROM current_condition_totals
+                JOIN current_conditions ON current_conditions.id=current_condition_totals.condition1
+                WHERE min_stars=:min_stars AND min_conflict_level=:min_conflict_level
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': max(kwargs.get('min_conflict_level', -1), -1),
+            }
+            self.and_equals('condition1', kwargs.get('condition1_name', []))
+            self.query += ' ORDER BY count DESC'
+            return self.rows()
+
+        #grouping by the condition of the other submission of each pair needs every pair
+        comparisons = self.comparisons(kwargs, type(kwargs.get('condition1_name')) is str)
+
         if type(kwargs.get('condition1_name')) is not str:
-            self.query = 'SELECT condition1_name AS condition_name'
+            self.query = 'SELECT condition1 AS condition'
         else:
-            self.query = 'SELECT condition2_name AS condition_name'
+            self.query = 'SELECT condition2 AS condition'
 
         if kwargs.get('original_genes'):
             self.query += ', COUNT(DISTINCT gene) AS gene_count'
@@ -425,8 +899,8 @@ class DB():
 
         self.query += '''
             , COUNT(DISTINCT submitter1_id) AS submitter_count
-            , COUNT(DISTINCT variant_name) AS count
-            FROM current_comparisons
+            , COUNT(DISTINCT variant) AS count
+            FROM ''' + comparisons + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -443,7 +917,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -466,13 +940,108 @@ class DB():
             else:
                 self.and_equals('normalized_gene_type', kwargs['gene_type'])
 
-        self.query += ' GROUP BY condition_name ORDER BY count DESC'
+        self.query += ' GROUP BY condition'
+
+        self.query = '''
+            SELECT current_conditions.name AS condition_name, gene_count, submitter_count, count
+            FROM (''' + self.query + ''') AS condition_totals
+            JOIN current_conditions ON current_conditions.id=condition_totals.condition
+            ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
+    @promise
+    def total_variants_by_condition_at_conflict_levels(self, **kwargs):
+        min_conflict_levels = kwargs['min_conflict_levels']
+
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'submitter1_id', 'significance1'])
+        if min_stars != None and type(kwargs.get('condition1_name', [])) == list:
+            self.query = '''
+                SELECT min_conflict_level, current_conditions.name AS condition_name, gene_count, submitter_count, count
+                FROM current_condition_totals
+                JOIN current_conditions ON current_conditions.id=current_condition_totals.condition1
+                WHERE min_stars=:min_stars AND min_conflict_level IN (SELECT value FROM json_each(:min_conflict_levels))
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_levels': json.dumps(list(map(lambda level: max(level, -1), min_conflict_levels))),
+            }
+            self.and_equals('condition1', kwargs.get('condition1_name', []))
+            self.query += ' ORDER BY count DESC'
+            return self.totals_at_conflict_levels(min_conflict_levels)
+
+        self.parameters = {
+            'min_stars1': kwargs.get('min_stars1', 0),
+            'min_stars2': kwargs.get('min_stars2', 0),
+        }
+
+        if type(kwargs.get('condition1_name')) is not str:
+            self.query = 'SELECT condition1 AS condition, '
+        else:
+            self.query = 'SELECT condition2 AS condition, '
+
+        self.query += self.counts_at_conflict_levels(
+            [
+                ('gene' if kwargs.get('original_genes') else 'normalized_gene', 'gene_count'),
+                ('submitter1_id', 'submitter_count'),
+                ('variant', 'count'),
+            ],
+            min_conflict_levels
+        )
+
+        self.query += '''
+            FROM ''' + self.comparisons(kwargs, type(kwargs.get('condition1_name')) is str) + '''
+            WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
+        '''
+
+        if kwargs.get('gene') != None:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene', kwargs['gene'])
+            else:
+                self.and_equals('normalized_gene', kwargs['gene'])
+
+        if kwargs.get('condition1_name'):
+            self.and_equals('condition1', kwargs['condition1_name'])
+
+        if kwargs.get('submitter1_id'):
+            self.and_equals('submitter1_id', kwargs['submitter1_id'])
+
+        if kwargs.get('significance1'):
+            if kwargs.get('original_terms'):
+                self.and_equals('significance1', kwargs['significance1'])
+            else:
+                self.and_equals('normalized_significance1', kwargs['significance1'])
+
+        if kwargs.get('normalized_method1'):
+            self.and_equals('normalized_method1', kwargs['normalized_method1'])
+
+        if kwargs.get('normalized_method2'):
+            self.and_equals('normalized_method2', kwargs['normalized_method2'])
+
+        if kwargs.get('gene_type', -1) != -1:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene_type', kwargs['gene_type'])
+            else:
+                self.and_equals('normalized_gene_type', kwargs['gene_type'])
+
+        self.query += ' GROUP BY condition'
+
+        self.query = '''
+            SELECT current_conditions.name AS condition_name, condition_totals.*
+            FROM (''' + self.query + ''') AS condition_totals
+            JOIN current_conditions ON current_conditions.id=condition_totals.condition
+        '''
+
+        return self.rows_at_conflict_levels(
+            ['condition_name'], ['gene_count', 'submitter_count', 'count'], min_conflict_levels
+        )
+
+    @memoize
     @promise
     def total_variants_by_condition_and_significance(self, **kwargs):
-        self.query = 'SELECT condition1_name AS condition_name, COUNT(DISTINCT variant_name) AS count'
+        self.query = 'SELECT condition1 AS condition, COUNT(DISTINCT variant) AS count'
 
         if kwargs.get('original_terms'):
             self.query += ', significance1 AS significance'
@@ -480,7 +1049,7 @@ class DB():
             self.query += ', normalized_significance1 AS significance'
 
         self.query += '''
-            FROM current_comparisons
+            FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -497,7 +1066,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -514,22 +1083,46 @@ class DB():
             else:
                 self.and_equals('normalized_gene_type', kwargs['gene_type'])
 
-        self.query += ' GROUP BY condition_name, significance'
+        self.query += ' GROUP BY condition, significance'
+
+        self.query = '''
+            SELECT current_conditions.name AS condition_name, count, current_significances.name AS significance
+            FROM (''' + self.query + ''') AS condition_totals
+            JOIN current_conditions ON current_conditions.id=condition_totals.condition
+            JOIN current_significances ON current_significances.id=condition_totals.significance
+        '''
 
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_by_gene(self, **kwargs):
+        min_stars = self.totals_min_stars(kwargs, ['condition1_name', 'submitter1_id', 'significance1'])
+        if min_stars != None and type(kwargs.get('gene', [])) == list:
+            self.query = '''
+                SELECT current_genes.name AS gene, condition_count, submitter_count, count
+                FROM current_gene_totals
+                JOIN current_genes ON current_genes.id=current_gene_totals.normalized_gene
+                WHERE min_stars=:min_stars AND min_conflict_level=:min_conflict_level
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': max(kwargs.get('min_conflict_level', -1), -1),
+            }
+            self.and_equals('normalized_gene', kwargs.get('gene', []))
+            self.query += ' ORDER BY count DESC'
+            return self.rows()
+
         if kwargs.get('original_genes'):
             self.query = 'SELECT gene'
         else:
             self.query = 'SELECT normalized_gene AS gene'
 
         self.query += '''
-            , COUNT(DISTINCT condition1_name) AS condition_count
+            , COUNT(DISTINCT condition1) AS condition_count
             , COUNT(DISTINCT submitter1_id) AS submitter_count
-            , COUNT(DISTINCT variant_name) AS count
-            FROM current_comparisons
+            , COUNT(DISTINCT variant) AS count
+            FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -540,7 +1133,7 @@ class DB():
         }
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -570,12 +1163,103 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('original_genes'):
-            self.query += ' GROUP BY gene ORDER BY count DESC'
+            self.query += ' GROUP BY gene'
         else:
-            self.query += ' GROUP BY normalized_gene ORDER BY count DESC'
+            self.query += ' GROUP BY normalized_gene'
+
+        self.query = '''
+            SELECT current_genes.name AS gene, condition_count, submitter_count, count
+            FROM (''' + self.query + ''') AS gene_totals
+            JOIN current_genes ON current_genes.id=gene_totals.gene
+            ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
+    @promise
+    def total_variants_by_gene_at_conflict_levels(self, **kwargs):
+        min_conflict_levels = kwargs['min_conflict_levels']
+
+        min_stars = self.totals_min_stars(kwargs, ['condition1_name', 'submitter1_id', 'significance1'])
+        if min_stars != None and type(kwargs.get('gene', [])) == list:
+            self.query = '''
+                SELECT min_conflict_level, current_genes.name AS gene, condition_count, submitter_count, count
+                FROM current_gene_totals
+                JOIN current_genes ON current_genes.id=current_gene_totals.normalized_gene
+                WHERE min_stars=:min_stars AND min_conflict_level IN (SELECT value FROM json_each(:min_conflict_levels))
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_levels': json.dumps(list(map(lambda level: max(level, -1), min_conflict_levels))),
+            }
+            self.and_equals('normalized_gene', kwargs.get('gene', []))
+            self.query += ' ORDER BY count DESC'
+            return self.totals_at_conflict_levels(min_conflict_levels)
+
+        self.parameters = {
+            'min_stars1': kwargs.get('min_stars1', 0),
+            'min_stars2': kwargs.get('min_stars2', 0),
+        }
+
+        if kwargs.get('original_genes'):
+            self.query = 'SELECT gene AS gene_id, '
+        else:
+            self.query = 'SELECT normalized_gene AS gene_id, '
+
+        self.query += self.counts_at_conflict_levels(
+            [('condition1', 'condition_count'), ('submitter1_id', 'submitter_count'), ('variant', 'count')],
+            min_conflict_levels
+        )
+
+        self.query += '''
+            FROM ''' + self.comparisons(kwargs) + '''
+            WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
+        '''
+
+        if kwargs.get('condition1_name'):
+            self.and_equals('condition1', kwargs['condition1_name'])
+
+        if kwargs.get('submitter1_id'):
+            self.and_equals('submitter1_id', kwargs['submitter1_id'])
+
+        if kwargs.get('significance1'):
+            if kwargs.get('original_terms'):
+                self.and_equals('significance1', kwargs['significance1'])
+            else:
+                self.and_equals('normalized_significance1', kwargs['significance1'])
+
+        if kwargs.get('normalized_method1'):
+            self.and_equals('normalized_method1', kwargs['normalized_method1'])
+
+        if kwargs.get('normalized_method2'):
+            self.and_equals('normalized_method2', kwargs['normalized_method2'])
+
+        if kwargs.get('gene_type', -1) != -1:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene_type', kwargs['gene_type'])
+            else:
+                self.and_equals('normalized_gene_type', kwargs['gene_type'])
+
+        if kwargs.get('gene'):
+            if kwargs.get('original_genes'):
+                self.and_equals('gene', kwargs['gene'])
+            else:
+                self.and_equals('normalized_gene', kwargs['gene'])
+
+        self.query += ' GROUP BY gene_id'
+
+        self.query = '''
+            SELECT current_genes.name AS gene, gene_totals.*
+            FROM (''' + self.query + ''') AS gene_totals
+            JOIN current_genes ON current_genes.id=gene_totals.gene_id
+        '''
+
+        return self.rows_at_conflict_levels(
+            ['gene'], ['condition_count', 'submitter_count', 'count'], min_conflict_levels
+        )
+
+    @memoize
     @promise
     def total_variants_by_gene_and_significance(self, **kwargs):
         if kwargs.get('original_genes'):
@@ -583,7 +1267,7 @@ class DB():
         else:
             self.query = 'SELECT normalized_gene AS gene'
 
-        self.query += ', COUNT(DISTINCT variant_name) AS count'
+        self.query += ', COUNT(DISTINCT variant) AS count'
 
         if kwargs.get('original_terms'):
             self.query += ', significance1 AS significance'
@@ -591,7 +1275,7 @@ class DB():
             self.query += ', normalized_significance1 AS significance'
 
         self.query += '''
-            FROM current_comparisons
+            FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -602,7 +1286,7 @@ class DB():
         }
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -624,11 +1308,34 @@ class DB():
         else:
             self.query += ' GROUP BY normalized_gene, significance'
 
+        self.query = '''
+            SELECT current_genes.name AS gene, count, current_significances.name AS significance
+            FROM (''' + self.query + ''') AS gene_totals
+            JOIN current_genes ON current_genes.id=gene_totals.gene
+            JOIN current_significances ON current_significances.id=gene_totals.significance
+        '''
+
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_by_significance(self, **kwargs):
-        self.query = 'SELECT COUNT(DISTINCT variant_name) AS count'
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'condition1_name', 'submitter1_id'])
+        if min_stars != None:
+            self.query = '''
+                SELECT count, current_significances.name AS significance, gene_count, condition_count, submitter_count
+                FROM current_significance_totals
+                JOIN current_significances ON current_significances.id=current_significance_totals.normalized_significance1
+                WHERE min_stars=:min_stars AND min_conflict_level=:min_conflict_level
+                ORDER BY count DESC
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': max(kwargs.get('min_conflict_level', -1), -1),
+            }
+            return self.rows()
+
+        self.query = 'SELECT COUNT(DISTINCT variant) AS count'
 
         if kwargs.get('original_terms'):
             self.query += ', significance1 AS significance'
@@ -641,9 +1348,9 @@ class DB():
             self.query += ', COUNT(DISTINCT normalized_gene) AS gene_count'
 
         self.query += '''
-            , COUNT(DISTINCT condition1_name) AS condition_count
+            , COUNT(DISTINCT condition1) AS condition_count
             , COUNT(DISTINCT submitter1_id) AS submitter_count
-            FROM current_comparisons
+            FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -660,7 +1367,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -677,16 +1384,49 @@ class DB():
             else:
                 self.and_equals('normalized_gene_type', kwargs['gene_type'])
 
-        self.query += ' GROUP BY significance ORDER BY count DESC'
+        self.query += ' GROUP BY significance'
+
+        self.query = '''
+            SELECT count, current_significances.name AS significance, gene_count, condition_count, submitter_count
+            FROM (''' + self.query + ''') AS significance_totals
+            JOIN current_significances ON current_significances.id=significance_totals.significance
+            ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_by_submitter(self, **kwargs):
-        if type(kwargs.get('submitter1_id')) is not str:
-            self.query = 'SELECT submitter1_id AS submitter_id, submitter1_name AS submitter_name'
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'condition1_name', 'submitter1_id', 'significance1'])
+        if min_stars != None:
+            self.query = '''
+                SELECT
+                    current_submitter_totals.submitter_id,
+                    current_submitters.name AS submitter_name,
+                    gene_count,
+                    condition_count,
+                    count
+                FROM current_submitter_totals
+                JOIN current_submitters ON current_submitters.id=current_submitter_totals.submitter_id
+                WHERE min_stars=:min_stars AND min_conflict_level=:min_conflict_level
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': max(kwargs.get('min_conflict_level', -1), -1),
+            }
+            if kwargs.get('submitter_ids'):
+                self.and_equals('submitter_id', kwargs['submitter_ids'])
+            self.query += ' ORDER BY count DESC'
+            return self.rows()
+
+        #grouping by the submitter of the other submission of each pair needs every pair
+        comparisons = self.comparisons(kwargs, type(kwargs.get('submitter1_id')) is int)
+
+        if type(kwargs.get('submitter1_id')) is not int:
+            self.query = 'SELECT submitter1_id AS submitter_id'
         else:
-            self.query = 'SELECT submitter2_id AS submitter_id, submitter2_name AS submitter_name'
+            self.query = 'SELECT submitter2_id AS submitter_id'
 
         if kwargs.get('original_genes'):
             self.query += ', COUNT(DISTINCT gene) AS gene_count'
@@ -694,9 +1434,9 @@ class DB():
             self.query += ', COUNT(DISTINCT normalized_gene) AS gene_count'
 
         self.query += '''
-            , COUNT(DISTINCT condition1_name) AS condition_count
-            , COUNT(DISTINCT variant_name) AS count
-            FROM current_comparisons
+            , COUNT(DISTINCT condition1) AS condition_count
+            , COUNT(DISTINCT variant) AS count
+            FROM ''' + comparisons + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -713,7 +1453,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -739,13 +1479,157 @@ class DB():
         if kwargs.get('submitter_ids'):
             self.and_equals('submitter_id', kwargs['submitter_ids'])
 
-        self.query += ' GROUP BY submitter_id ORDER BY count DESC'
+        self.query += ' GROUP BY submitter_id'
+
+        self.query = '''
+            SELECT
+                submitter_totals.submitter_id,
+                current_submitters.name AS submitter_name,
+                gene_count,
+                condition_count,
+                count
+            FROM (''' + self.query + ''') AS submitter_totals
+            JOIN current_submitters ON current_submitters.id=submitter_totals.submitter_id
+            ORDER BY count DESC
+        '''
 
         return self.rows()
 
+    @memoize
+    @promise
+    def total_variants_by_submitter_at_conflict_levels(self, **kwargs):
+        min_conflict_levels = kwargs['min_conflict_levels']
+
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'condition1_name', 'submitter1_id', 'significance1'])
+        if min_stars != None:
+            self.query = '''
+                SELECT
+                    min_conflict_level,
+                    current_submitter_totals.submitter_id,
+                    current_submitters.name AS submitter_name,
+                    gene_count,
+                    condition_count,
+                    count
+                FROM current_submitter_totals
+                JOIN current_submitters ON current_submitters.id=current_submitter_totals.submitter_id
+                WHERE min_stars=:min_stars AND min_conflict_level IN (SELECT value FROM json_each(:min_conflict_levels))
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_levels': json.dumps(list(map(lambda level: max(level, -1), min_conflict_levels))),
+            }
+            if kwargs.get('submitter_ids'):
+                self.and_equals('submitter_id', kwargs['submitter_ids'])
+            self.query += ' ORDER BY count DESC'
+            return self.totals_at_conflict_levels(min_conflict_levels)
+
+        #one submitter is broken down by the other submitter of each pair, a list of them by themselves
+        min_stars = self.totals_min_stars(kwargs, ['gene', 'condition1_name', 'significance1'])
+        if min_stars != None:
+            if type(kwargs.get('submitter1_id')) is not int:
+                submitter_column = 'submitter1_id'
+            else:
+                submitter_column = 'submitter2_id'
+            self.query = '''
+                SELECT
+                    min_conflict_level,
+                    ''' + submitter_column + ''' AS submitter_id,
+                    current_submitters.name AS submitter_name,
+                    gene_count,
+                    condition_count,
+                    count
+                FROM current_submitter_pair_totals
+                JOIN current_submitters ON current_submitters.id=current_submitter_pair_totals.''' + submitter_column + '''
+                WHERE min_stars=:min_stars AND min_conflict_level IN (SELECT value FROM json_each(:min_conflict_levels))
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_levels': json.dumps(list(map(lambda level: max(level, -1), min_conflict_levels))),
+            }
+            if submitter_column == 'submitter1_id':
+                self.and_equals('submitter1_id', kwargs['submitter1_id'])
+                self.query += ' AND submitter2_id IS NULL'
+            else:
+                self.query += ' AND submitter1_id=:submitter1_id AND submitter2_id IS NOT NULL'
+                self.parameters['submitter1_id'] = kwargs['submitter1_id']
+            if kwargs.get('submitter_ids'):
+                self.and_equals(submitter_column, kwargs['submitter_ids'])
+            self.query += ' ORDER BY count DESC'
+            return self.totals_at_conflict_levels(min_conflict_levels)
+
+        self.parameters = {
+            'min_stars1': kwargs.get('min_stars1', 0),
+            'min_stars2': kwargs.get('min_stars2', 0),
+        }
+
+        if type(kwargs.get('submitter1_id')) is not int:
+            self.query = 'SELECT submitter1_id AS submitter_id, '
+        else:
+            self.query = 'SELECT submitter2_id AS submitter_id, '
+
+        self.query += self.counts_at_conflict_levels(
+            [
+                ('gene' if kwargs.get('original_genes') else 'normalized_gene', 'gene_count'),
+                ('condition1', 'condition_count'),
+                ('variant', 'count'),
+            ],
+            min_conflict_levels
+        )
+
+        self.query += '''
+            FROM ''' + self.comparisons(kwargs, type(kwargs.get('submitter1_id')) is int) + '''
+            WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
+        '''
+
+        if kwargs.get('gene') != None:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene', kwargs['gene'])
+            else:
+                self.and_equals('normalized_gene', kwargs['gene'])
+
+        if kwargs.get('condition1_name'):
+            self.and_equals('condition1', kwargs['condition1_name'])
+
+        if kwargs.get('submitter1_id'):
+            self.and_equals('submitter1_id', kwargs['submitter1_id'])
+
+        if kwargs.get('significance1'):
+            if kwargs.get('original_terms'):
+                self.and_equals('significance1', kwargs['significance1'])
+            else:
+                self.and_equals('normalized_significance1', kwargs['significance1'])
+
+        if kwargs.get('normalized_method1'):
+            self.and_equals('normalized_method1', kwargs['normalized_method1'])
+
+        if kwargs.get('normalized_method2'):
+            self.and_equals('normalized_method2', kwargs['normalized_method2'])
+
+        if kwargs.get('gene_type', -1) != -1:
+            if kwargs.get('original_genes'):
+                self.and_equals('gene_type', kwargs['gene_type'])
+            else:
+                self.and_equals('normalized_gene_type', kwargs['gene_type'])
+
+        if kwargs.get('submitter_ids'):
+            self.and_equals('submitter_id', kwargs['submitter_ids'])
+
+        self.query += ' GROUP BY submitter_id'
+
+        self.query = '''
+            SELECT current_submitters.name AS submitter_name, submitter_totals.*
+            FROM (''' + self.query + ''') AS submitter_totals
+            JOIN current_submitters ON current_submitters.id=submitter_totals.submitter_id
+        '''
+
+        return self.rows_at_conflict_levels(
+            ['submitter_id', 'submitter_name'], ['gene_count', 'condition_count', 'count'], min_conflict_levels
+        )
+
+    @memoize
     @promise
     def total_variants_by_submitter_and_significance(self, **kwargs):
-        self.query = 'SELECT submitter1_id AS submitter_id, COUNT(DISTINCT variant_name) AS count'
+        self.query = 'SELECT submitter1_id AS submitter_id, COUNT(DISTINCT variant) AS count'
 
         if kwargs.get('original_terms'):
             self.query += ', significance1 AS significance'
@@ -753,7 +1637,7 @@ class DB():
             self.query += ', normalized_significance1 AS significance'
 
         self.query += '''
-            FROM current_comparisons
+            FROM ''' + self.comparisons(kwargs) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -770,7 +1654,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('normalized_method1'):
             self.and_equals('normalized_method1', kwargs['normalized_method1'])
@@ -786,19 +1670,27 @@ class DB():
 
         self.query += ' GROUP BY submitter_id, significance'
 
+        self.query = '''
+            SELECT submitter_id, count, current_significances.name AS significance
+            FROM (''' + self.query + ''') AS submitter_totals
+            JOIN current_significances ON current_significances.id=submitter_totals.significance
+        '''
+
         return self.rows()
 
 
+    @memoize
     @promise
     def total_variants_in_conflict_by_condition_and_conflict_level(self, **kwargs):
         if type(kwargs.get('condition1_name')) is not str:
-            self.query = 'SELECT condition1_name AS condition_name'
+            self.query = 'SELECT condition1 AS condition'
         else:
-            self.query = 'SELECT condition2_name AS condition_name'
+            self.query = 'SELECT condition2 AS condition'
 
+        #the variant rollup only knows the condition of the first submission of each pair
         self.query += '''
-            , conflict_level, COUNT(DISTINCT variant_name) AS count
-            FROM current_comparisons
+            , conflict_level, COUNT(DISTINCT variant) AS count
+            FROM ''' + self.comparisons(kwargs, True, type(kwargs.get('condition1_name')) is not str) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -809,7 +1701,7 @@ class DB():
         }
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('normalized_method1'):
             self.and_equals('normalized_method1', kwargs['normalized_method1'])
@@ -817,14 +1709,35 @@ class DB():
         if kwargs.get('normalized_method2'):
             self.and_equals('normalized_method2', kwargs['normalized_method2'])
 
-        self.query += ' GROUP BY condition_name, conflict_level'
+        self.query += ' GROUP BY condition, conflict_level'
+
+        self.query = '''
+            SELECT current_conditions.name AS condition_name, conflict_level, count
+            FROM (''' + self.query + ''') AS condition_totals
+            JOIN current_conditions ON current_conditions.id=condition_totals.condition
+        '''
 
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_in_conflict_by_conflict_level(self, **kwargs):
+        min_stars = self.submitter_pair_min_stars(kwargs, ['gene', 'condition1_name'])
+        if min_stars != None and kwargs.get('min_conflict_level', 1) >= 1:
+            self.query = '''
+                SELECT conflict_level, count FROM current_submitter_pair_conflict_levels
+                WHERE min_stars=:min_stars AND conflict_level>=:min_conflict_level
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': kwargs.get('min_conflict_level', 1),
+            }
+            self.and_submitter_pair(kwargs)
+            return self.rows()
+
         self.query = '''
-            SELECT conflict_level, COUNT(DISTINCT variant_name) AS count FROM current_comparisons
+            SELECT conflict_level, COUNT(DISTINCT variant) AS count
+            FROM ''' + self.comparisons(kwargs, True, True) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -841,7 +1754,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -865,6 +1778,7 @@ class DB():
 
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_in_conflict_by_gene_and_conflict_level(self, **kwargs):
         if kwargs.get('original_genes'):
@@ -873,8 +1787,8 @@ class DB():
             self.query = 'SELECT normalized_gene AS gene'
 
         self.query += '''
-            , conflict_level, COUNT(DISTINCT variant_name) AS count
-            FROM current_comparisons
+            , conflict_level, COUNT(DISTINCT variant) AS count
+            FROM ''' + self.comparisons(kwargs, True, True) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -907,10 +1821,35 @@ class DB():
         else:
             self.query += ' GROUP BY normalized_gene, conflict_level'
 
+        self.query = '''
+            SELECT current_genes.name AS gene, conflict_level, count
+            FROM (''' + self.query + ''') AS gene_totals
+            JOIN current_genes ON current_genes.id=gene_totals.gene
+        '''
+
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_in_conflict_by_significance_and_significance(self, **kwargs):
+        min_stars = self.submitter_pair_min_stars(kwargs, ['gene', 'condition1_name'])
+        if min_stars != None and kwargs.get('min_conflict_level', 1) >= 1:
+            self.query = '''
+                SELECT significances1.name AS significance1, significances2.name AS significance2, conflict_level, count
+                FROM current_submitter_pair_significances
+                JOIN current_significances AS significances1
+                    ON significances1.id=current_submitter_pair_significances.significance1
+                JOIN current_significances AS significances2
+                    ON significances2.id=current_submitter_pair_significances.significance2
+                WHERE min_stars=:min_stars AND conflict_level>=:min_conflict_level
+            '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': kwargs.get('min_conflict_level', 1),
+            }
+            self.and_submitter_pair(kwargs)
+            return self.rows()
+
         if kwargs.get('original_terms'):
             self.query = 'SELECT significance1, significance2'
         else:
@@ -918,7 +1857,7 @@ class DB():
                 SELECT normalized_significance1 AS significance1, normalized_significance2 AS significance2
             '''
 
-        self.query += ', conflict_level, COUNT(DISTINCT variant_name) AS count FROM current_comparisons'
+        self.query += ', conflict_level, COUNT(DISTINCT variant) AS count FROM current_comparisons'
 
         self.query += '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
@@ -937,7 +1876,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -962,17 +1901,45 @@ class DB():
         else:
             self.query += ' GROUP BY normalized_significance1, normalized_significance2'
 
+        self.query = '''
+            SELECT significances1.name AS significance1, significances2.name AS significance2, conflict_level, count
+            FROM (''' + self.query + ''') AS significance_totals
+            JOIN current_significances AS significances1 ON significances1.id=significance_totals.significance1
+            JOIN current_significances AS significances2 ON significances2.id=significance_totals.significance2
+        '''
+
         return self.rows()
 
+    @memoize
     @promise
     def total_variants_in_conflict_by_submitter_and_conflict_level(self, **kwargs):
-        if type(kwargs.get('submitter1_id')) is not str:
+        min_stars = self.totals_min_stars(kwargs, [])
+        if min_stars != None and kwargs.get('min_conflict_level', 1) >= 1:
+            if type(kwargs.get('submitter1_id')) is not int:
+                self.query = '''
+                    SELECT submitter1_id AS submitter_id, conflict_level, count FROM current_submitter_pair_conflict_levels
+                    WHERE min_stars=:min_stars AND conflict_level>=:min_conflict_level AND submitter2_id IS NULL
+                '''
+            else:
+                self.query = '''
+                    SELECT submitter2_id AS submitter_id, conflict_level, count FROM current_submitter_pair_conflict_levels
+                    WHERE min_stars=:min_stars AND conflict_level>=:min_conflict_level AND submitter2_id IS NOT NULL
+                '''
+            self.parameters = {
+                'min_stars': min_stars,
+                'min_conflict_level': kwargs.get('min_conflict_level', 1),
+            }
+            if kwargs.get('submitter1_id'):
+                self.and_equals('submitter1_id', kwargs['submitter1_id'])
+            return self.rows()
+
+        if type(kwargs.get('submitter1_id')) is not int:
             self.query = 'SELECT submitter1_id AS submitter_id'
         else:
             self.query = 'SELECT submitter2_id AS submitter_id'
 
         self.query += '''
-            , conflict_level, COUNT(DISTINCT variant_name) AS count
+            , conflict_level, COUNT(DISTINCT variant) AS count
             FROM current_comparisons
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
@@ -996,9 +1963,10 @@ class DB():
 
         return self.rows()
 
+    @memoize
     def total_variants_without_significance(self, **kwargs):
         self.query = '''
-            SELECT COUNT(DISTINCT variant_name) FROM current_comparisons
+            SELECT COUNT(DISTINCT variant) FROM current_comparisons
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -1009,10 +1977,13 @@ class DB():
             'significance': kwargs['significance'],
         }
 
+        #IS NOT rather than != so that a term that is not in use excludes nothing
         if kwargs.get('original_terms'):
-            self.query += ' AND significance1!=:significance AND significance2!=:significance'
+            self.query += ' AND significance1 IS NOT (SELECT id FROM current_significances WHERE name=:significance)'
+            self.query += ' AND significance2 IS NOT (SELECT id FROM current_significances WHERE name=:significance)'
         else:
-            self.query += ' AND normalized_significance1!=:significance AND normalized_significance2!=:significance'
+            self.query += ' AND normalized_significance1 IS NOT (SELECT id FROM current_significances WHERE name=:significance)'
+            self.query += ' AND normalized_significance2 IS NOT (SELECT id FROM current_significances WHERE name=:significance)'
 
         if kwargs.get('normalized_method1'):
             self.and_equals('normalized_method1', kwargs['normalized_method1'])
@@ -1028,41 +1999,53 @@ class DB():
 
         return self.value()
 
+    @memoize
     def variant_info(self, variant_name):
         try:
-            row = list(self.cursor.execute(
-                'SELECT variant_id, rsid FROM current_submissions WHERE variant_name=? LIMIT 1', [variant_name]
-            ))[0]
+            row = list(self.cursor.execute('''
+                SELECT variant_id, rsid FROM current_submissions
+                WHERE variant=(SELECT id FROM current_variants WHERE name=?) LIMIT 1
+            ''', [variant_name]))[0]
             return {'id': row[0], 'name': variant_name, 'rsid': row[1]}
         except IndexError:
             return None
 
+    @memoize
     def variant_name_from_rcv(self, rcv):
         try:
-            return list(self.cursor.execute(
-                'SELECT variant_name FROM current_submissions WHERE rcv=? LIMIT 1', [rcv]
-            ))[0][0]
+            return list(self.cursor.execute('''
+                SELECT current_variants.name FROM current_submissions
+                JOIN current_variants ON current_variants.id=current_submissions.variant
+                WHERE rcv=? LIMIT 1
+            ''', [rcv]))[0][0]
         except IndexError:
             return None
 
+    @memoize
     def variant_name_from_rsid(self, rsid):
-        rows = list(self.cursor.execute(
-            'SELECT DISTINCT variant_name FROM current_submissions WHERE rsid=?', [rsid]
-        ))
+        rows = list(self.cursor.execute('''
+            SELECT DISTINCT current_variants.name FROM current_submissions
+            JOIN current_variants ON current_variants.id=current_submissions.variant
+            WHERE rsid=?
+        ''', [rsid]))
         return rows[0][0] if len(rows) == 1 else None
 
+    @memoize
     def variant_name_from_scv(self, scv):
         try:
-            return list(self.cursor.execute(
-                'SELECT variant_name FROM current_submissions WHERE scv=? LIMIT 1', [scv]
-            ))[0][0]
+            return list(self.cursor.execute('''
+                SELECT current_variants.name FROM current_submissions
+                JOIN current_variants ON current_variants.id=current_submissions.variant
+                WHERE scv=? LIMIT 1
+            ''', [scv]))[0][0]
         except IndexError:
             return None
 
+    @memoize
     @promise
     def variants(self, **kwargs):
         self.query = '''
-            SELECT variant_name, rsid FROM current_comparisons
+            SELECT variant FROM ''' + self.comparisons(kwargs, variants_only=True) + '''
             WHERE star_level1>=:min_stars1 AND star_level2>=:min_stars2 AND conflict_level>=:min_conflict_level
         '''
 
@@ -1079,7 +2062,7 @@ class DB():
                 self.and_equals('normalized_gene', kwargs['gene'])
 
         if kwargs.get('condition1_name'):
-            self.and_equals('condition1_name', kwargs['condition1_name'])
+            self.and_equals('condition1', kwargs['condition1_name'])
 
         if kwargs.get('submitter1_id'):
             self.and_equals('submitter1_id', kwargs['submitter1_id'])
@@ -1111,6 +2094,15 @@ class DB():
             else:
                 self.and_equals('normalized_gene_type', kwargs['gene_type'])
 
-        self.query += ' GROUP BY variant_name ORDER BY variant_name'
+        self.query += ' GROUP BY variant'
+
+        self.query = '''
+            SELECT
+                current_variants.name AS variant_name,
+                (SELECT rsid FROM current_submissions WHERE variant=variant_rows.variant LIMIT 1) AS rsid
+            FROM (''' + self.query + ''') AS variant_rows
+            JOIN current_variants ON current_variants.id=variant_rows.variant
+            ORDER BY variant_name
+        '''
 
         return self.rows()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, timedelta
+from http.client import IncompleteRead
+from multiprocessing import Pool, cpu_count
+from os import remove, rename
+from os.path import basename, exists
+from queue import Queue
+from shutil import copyfileobj
+from sys import argv
+from threading import Lock
+from time import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+importer = __import__('import-clinvar-xml')
+
+shard = '--shards' in argv #write each month to its own database so that imports do not share a lock
+args = [arg for arg in argv[1:] if arg != '--shards']
+jobs = int(args[0]) if args else 2 #number of months to parse at the same time
+downloads_ahead = jobs #number of months to download while waiting for a parsing slot
+
+def get_release_urls():
+    today = date.today()
+    for year in range(2012, today.year + 1):
+        for month in range(1, (today.month if year == today.year else 12) + 1):
+            filename = 'ClinVarFullRelease_' + str(year) + '-' + str(month).zfill(2) + '.xml.gz'
+            if year < today.year:
+                yield 'ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/xml/archive/' + str(year) + '/' + filename
+            else:
+                yield 'ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/xml/' + filename
+
+def download(url):
+    filename = basename(url)
+    try:
+        with urlopen(url) as response, open(filename + '.part', 'wb') as f:
+            copyfileobj(response, f, 1 << 20)
+            #reading an HTTP response in pieces does not notice if the server hangs up before the end
+            if getattr(response, 'length', None):
+                raise IncompleteRead(b'', response.length)
+        rename(filename + '.part', filename)
+    except URLError as err:
+        print('Skipped unavailable release ' + url + ' (' + str(err.reason) + ')')
+        return None
+    finally:
+        #a download that failed in any way must not be mistaken for a complete one
+        if exists(filename + '.part'):
+            remove(filename + '.part')
+    return filename
+
+def backfill(url):
+    filename = download(url)
+    if not filename:
+        return False
+
+    try:
+        #a pool of parsers works through one release at a time, so each month that is parsed at once needs its own
+        pool = idle_pools.get()
+        try:
+            return importer.import_file(filename, processes, write_lock, False, shard, pool) != None
+        finally:
+            idle_pools.put(pool)
+    finally:
+        remove(filename)
+
+def print_progress(url, finished, done, imported):
+    message = (
+        ('Finished ' if finished else 'Skipped ') + basename(url) + ': ' +
+        str(done) + ' of ' + str(len(urls)) + ' releases processed'
+    )
+
+    #releases that were skipped took no time, so only the imported ones tell how long the rest will take
+    if imported:
+        eta = timedelta(seconds=round((time() - start_time) / imported * (len(urls) - done)))
+        message += ', about ' + str(eta) + ' remaining'
+    print(message)
+
+importer.create_tables()
+importer.create_imports_table()
+
+db = importer.connect()
+imported_dates = set(map(lambda row: row[0], db.execute('SELECT date FROM imports')))
+db.close()
+
+urls = [url for url in get_release_urls() if importer.get_release_date(url) not in imported_dates]
+print(str(len(imported_dates)) + ' releases already imported, ' + str(len(urls)) + ' to go')
+
+write_lock = Lock()
+processes = cpu_count() // jobs or 1
+idle_pools = Queue()
+start_time = time()
+imported = 0
+
+with ExitStack() as pools:
+    #the parsers are started before the download and import threads, because forking after that is unsafe
+    for job in range(jobs):
+        idle_pools.put(pools.enter_context(Pool(processes)))
+
+    with ThreadPoolExecutor(jobs + downloads_ahead) as executor:
+        futures = list(map(lambda url: (url, executor.submit(backfill, url)), urls))
+        for done, (url, future) in enumerate(futures, 1):
+            try:
+                finished = future.result()
+            except Exception as err:
+                #the release stays out of the manifest, so the next run will try it again
+                print('Failed to import ' + basename(url) + ': ' + repr(err))
+                finished = False
+            if finished:
+                imported += 1
+            print_progress(url, finished, done, imported)
+
+importer.backfill_monthly_totals()
@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 
-from collections import OrderedDict
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager, nullcontext
 from copy import copy
 from functools import partial
-from mmap import mmap
-from multiprocessing import Pool
-from os.path import basename
+from glob import glob
+from hashlib import sha256
+from itertools import chain, product
+from multiprocessing import Pool, cpu_count
+from os import makedirs, remove, rename
+from os.path import basename, exists
 from pycountry import countries
-from sys import argv
+from queue import Queue
+from sys import argv, stdin, stdout
+from threading import Lock, Semaphore, Thread
+from time import time
+from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import urlopen
 from xml.etree import ElementTree
 import csv
+import gzip
 import re
 import sqlite3
 
@@ -30,97 +41,336 @@ standard_methods = [
     'research',
 ]
 
-def connect():
-    return sqlite3.connect('clinvar.db', timeout=600)
-
-def create_tables():
-    db = connect()
+#conflict levels between different normalized significance terms, anything else is a category conflict
+significance_conflict_levels = {}
+for significances1, significances2, conflict_level in [
+    (['benign'], ['likely benign'], 2),
+    (['pathogenic'], ['likely pathogenic'], 2),
+    (['benign', 'likely benign'], ['uncertain significance'], 3),
+    (['benign', 'likely benign', 'uncertain significance'], ['pathogenic', 'likely pathogenic'], 5),
+]:
+    for significance1 in significances1:
+        for significance2 in significances2:
+            significance_conflict_levels[(significance1, significance2)] = conflict_level
+            significance_conflict_levels[(significance2, significance1)] = conflict_level
+
+#the layout of the tables in clinvar.db and in the shards, which is checked before importing into them
+schema_version = 1
+
+def connect(filename='clinvar.db'):
+    #URI filenames let other databases be attached read-only
+    return sqlite3.connect(filename, timeout=600, uri=True)
+
+def get_shard_filename(date):
+    return 'shards/' + date + '.db'
+
+def get_shard_filenames():
+    return sorted(glob('shards/*.db'))
+
+def create_tables(filename='clinvar.db'):
+    db = connect(filename)
     cursor = db.cursor()
 
+    #tables of an older layout would be kept by CREATE TABLE IF NOT EXISTS and then fail on the first insert
+    version = list(cursor.execute('PRAGMA user_version'))[0][0]
+    if version != schema_version and list(cursor.execute(
+        'SELECT 1 FROM sqlite_master WHERE type=\'table\' AND name IN (\'submissions\', \'comparisons\')'
+    )):
+        db.close()
+        raise SystemExit(
+            filename + ' was built by an older version of ClinVar Miner. Rebuild it with `make clean && make`.'
+        )
+    cursor.execute('PRAGMA user_version=' + str(schema_version))
+
+    #repeated names are stored once in dimension tables and referred to by integer keys everywhere else
+    for dimension in ['variants', 'genes', 'significances', 'review_statuses', 'methods']:
+        cursor.execute('CREATE TABLE IF NOT EXISTS ' + dimension + ' (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+
+    #the name and country of a submitter and the cross-references of a condition come from the newest release
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS submitters (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            country_code TEXT,
+            country_name TEXT,
+            date TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conditions (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            xrefs TEXT,
+            date TEXT
+        )
+    ''')
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS submissions (
+            id INTEGER PRIMARY KEY,
             date TEXT,
             variant_id INTEGER,
-            variant_name TEXT,
+            variant INTEGER,
             rsid TEXT,
-            gene TEXT,
+            gene INTEGER,
             gene_type INTEGER,
-            normalized_gene TEXT,
+            normalized_gene INTEGER,
             normalized_gene_type INTEGER,
             submitter_id INTEGER,
-            submitter_name TEXT,
-            submitter_country_code TEXT,
-            submitter_country_name TEXT,
             rcv TEXT,
             scv TEXT,
-            significance TEXT,
-            normalized_significance TEXT,
+            significance INTEGER,
+            normalized_significance INTEGER,
             last_eval TEXT,
-            review_status TEXT,
+            review_status INTEGER,
             star_level INTEGER,
-            condition_name TEXT,
-            condition_xrefs TEXT,
-            method TEXT,
-            normalized_method TEXT,
+            condition INTEGER,
+            method INTEGER,
+            normalized_method INTEGER,
             comment TEXT,
-            PRIMARY KEY (date, scv)
+            UNIQUE (date, scv)
         )
     ''')
 
     cursor.execute('CREATE INDEX IF NOT EXISTS submissions__date ON submissions (date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS submissions__variant_name ON submissions (variant_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS submissions__variant ON submissions (variant)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS submissions__date__variant ON submissions (date, variant)')
     cursor.execute('CREATE INDEX IF NOT EXISTS submissions__significance ON submissions (significance)')
 
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS comparisons (
             date TEXT,
-            variant_id TEXT,
-            variant_name TEXT,
-            rsid TEXT,
-            gene TEXT,
+            submission1 INTEGER,
+            submission2 INTEGER,
+
+            variant INTEGER,
+            gene INTEGER,
             gene_type INTEGER,
-            normalized_gene TEXT,
+            normalized_gene INTEGER,
             normalized_gene_type INTEGER,
 
             submitter1_id INTEGER,
-            submitter1_name TEXT,
-            submitter1_country_code TEXT,
-            submitter1_country_name TEXT,
-            rcv1 TEXT,
-            scv1 TEXT,
-            significance1 TEXT,
-            normalized_significance1 TEXT,
-            last_eval1 TEXT,
-            review_status1 TEXT,
+            significance1 INTEGER,
+            normalized_significance1 INTEGER,
             star_level1 INTEGER,
-            condition1_name TEXT,
-            condition1_xrefs TEXT,
-            method1 TEXT,
-            normalized_method1 TEXT,
-            comment1 TEXT,
+            condition1 INTEGER,
+            normalized_method1 INTEGER,
 
             submitter2_id INTEGER,
-            submitter2_name TEXT,
-            scv2 TEXT,
-            significance2 TEXT,
-            normalized_significance2 TEXT,
+            significance2 INTEGER,
+            normalized_significance2 INTEGER,
             star_level2 INTEGER,
-            condition2_name TEXT,
-            normalized_method2 TEXT,
+            condition2 INTEGER,
+            normalized_method2 INTEGER,
 
             conflict_level INTEGER,
 
-            PRIMARY KEY (date, scv1, scv2)
+            PRIMARY KEY (date, submission1, submission2)
         )
     ''')
 
     cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__date ON comparisons (date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__scv1 ON comparisons (scv1)')
     cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__star_level1 ON comparisons (star_level1)')
     cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__normalized_method1 ON comparisons (normalized_method1)')
     cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__star_level2 ON comparisons (star_level2)')
     cursor.execute('CREATE INDEX IF NOT EXISTS comparisons__conflict_level ON comparisons (conflict_level)')
 
+    #a handful of numbers per release for the charts over time, which would otherwise read every release in full
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_method_totals (
+            date TEXT,
+            normalized_method INTEGER,
+            min_stars INTEGER,
+            min_conflict_level INTEGER,
+            count INTEGER,
+            PRIMARY KEY (date, min_stars, min_conflict_level, normalized_method)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_significance_totals (
+            date TEXT,
+            significance INTEGER,
+            count INTEGER,
+            PRIMARY KEY (date, significance)
+        )
+    ''')
+
+    db.close()
+
+def create_imports_table():
+    db = connect()
+    cursor = db.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS imports (
+            date TEXT,
+            source TEXT,
+            sha256 TEXT,
+            submissions INTEGER,
+            comparisons INTEGER,
+            PRIMARY KEY (date)
+        )
+    ''')
+
+    db.close()
+
+def write_monthly_totals(filename, date):
+    #count the submissions of each method at every star level and conflict level that the charts can filter by, which
+    #for each submission only depends on the highest conflict level it reaches against submissions with enough stars
+    star_levels = range(0, 5)
+    conflict_levels = ' UNION ALL '.join(map(lambda level: 'SELECT ' + str(level) + ' AS conflict_level', range(-1, 6)))
+    db = connect(filename)
+    cursor = db.cursor()
+
+    cursor.execute('DELETE FROM monthly_method_totals WHERE date=?', [date])
+    cursor.execute(
+        'WITH max_conflict_levels AS (SELECT normalized_method1, star_level1, ' +
+        ', '.join(map(
+            lambda star_level: (
+                'MAX(CASE WHEN star_level2>=' + str(star_level) + ' THEN conflict_level END) ' +
+                'AS max_conflict_level' + str(star_level)
+            ),
+            star_levels
+        )) +
+        ' FROM comparisons WHERE date=:date GROUP BY submission1) ' +
+        'INSERT INTO monthly_method_totals ' +
+        ' UNION ALL '.join(map(
+            lambda star_level: (
+                'SELECT :date, normalized_method1, ' + str(star_level) + ', conflict_levels.conflict_level, COUNT(*) ' +
+                'FROM max_conflict_levels JOIN (' + conflict_levels + ') AS conflict_levels ' +
+                'ON max_conflict_level' + str(star_level) + '>=conflict_levels.conflict_level ' +
+                'WHERE star_level1>=' + str(star_level) + ' ' +
+                'GROUP BY normalized_method1, conflict_levels.conflict_level'
+            ),
+            star_levels
+        )),
+        {'date': date}
+    )
+
+    cursor.execute('DELETE FROM monthly_significance_totals WHERE date=?', [date])
+    cursor.execute(
+        'INSERT INTO monthly_significance_totals SELECT date, significance, COUNT(*) FROM submissions ' +
+        'WHERE date=? GROUP BY significance',
+        [date]
+    )
+
+    db.commit()
+    db.close()
+
+def backfill_monthly_totals():
+    #releases imported before the monthly totals existed get them the next time the importer runs
+    for filename in ['clinvar.db'] + get_shard_filenames():
+        create_tables(filename)
+        db = connect(filename)
+        dates = []
+        date = ''
+        while True:
+            #hop from one release to the next through the index instead of reading every submission
+            date = list(db.execute('SELECT MIN(date) FROM submissions WHERE date>?', [date]))[0][0]
+            if date == None:
+                break
+            if not list(db.execute('SELECT 1 FROM monthly_significance_totals WHERE date=? LIMIT 1', [date])):
+                dates.append(date)
+        db.close()
+
+        for date in dates:
+            print('Counting the monthly totals of ' + date + ' in ' + filename)
+            write_monthly_totals(filename, date)
+
+class ChecksumReader():
+    #hash everything read from the file, before decompression, as it goes by
+    def __init__(self, f, checksum):
+        self.f = f
+        self.checksum = checksum
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.checksum.update(data)
+        return data
+
+class ReplayReader():
+    #give back what was already read from the file before reading the rest of it
+    def __init__(self, head, f):
+        self.head = head
+        self.f = f
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.f.read(size)
+        if size < 0:
+            data = self.head + self.f.read()
+            self.head = b''
+        else:
+            data = self.head[0:size]
+            self.head = self.head[size:]
+        return data
+
+def read_release_date(f):
+    #read as far as the release set tag, which can come after any amount of XML declarations and comments, and return
+    #the date with a reader that starts over from the beginning
+    head = b''
+    while not re.search(rb'<ReleaseSet [^>]*>|<ClinVarSet ', head):
+        chunk = f.read(1 << 16)
+        if not chunk:
+            break
+        head += chunk
+
+    matches = re.search(rb'<ReleaseSet [^>]*Dated="(\d\d\d\d-\d\d)', head)
+    return (matches.group(1).decode() if matches else None, ReplayReader(head, f))
+
+@contextmanager
+def open_release(source, checksum):
+    #stream a release from standard input, a URL or a local file, decompressing it on the fly if it is gzipped
+    if source == '-':
+        f = stdin.buffer
+    elif urlparse(source).scheme in ['http', 'https', 'ftp']:
+        f = urlopen(source)
+    else:
+        f = open(source, 'rb')
+
+    with f:
+        reader = ChecksumReader(f, checksum)
+        if source.endswith('.gz') or (source == '-' and f.peek(2)[0:2] == b'\x1f\x8b'):
+            with gzip.GzipFile(fileobj=reader) as gzip_file:
+                yield gzip_file
+        else:
+            yield reader
+
+def get_release_date(source):
+    matches = re.fullmatch(r'ClinVarFullRelease_(\d\d\d\d-\d\d).xml(.gz)?', basename(urlparse(source).path))
+    return matches.group(1) if matches else None
+
+def get_clinvarsets(f, chunk_size=1 << 20):
+    #hack the ClinVar XML file into pieces without ever holding more than a few chunks of it in memory
+    start_tag = b'<ClinVarSet '
+    end_tag = b'</ClinVarSet>'
+    buf = b''
+    pos = 0
+    while True:
+        start = buf.find(start_tag, pos)
+        end = buf.find(end_tag, start) if start != -1 else -1
+        if end != -1:
+            end += len(end_tag)
+            yield buf[start:end]
+            pos = end
+            continue
+
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+
+        #keep the incomplete ClinVarSet, or enough of the tail to find a start tag split between chunks
+        buf = buf[start if start != -1 else max(pos, len(buf) - len(start_tag)):] + chunk
+        pos = 0
+
+def throttle(iterable, semaphore):
+    #the pool reads ahead as fast as it can, so make it wait until earlier results have been collected
+    for item in iterable:
+        semaphore.acquire()
+        yield item
+
 def get_gene_type(genes, small_variant):
     if len(genes) == 0:
         return 0 #intergenic
@@ -283,75 +533,355 @@ def get_submissions(date, set_xml):
 
     return submissions
 
-def import_file(filename):
-    matches = re.fullmatch(r'ClinVarFullRelease_(\d\d\d\d-\d\d).xml', basename(filename))
-    if matches:
-        print('Importing ' + filename)
-    else:
-        print('Skipped unrecognized filename ' + filename)
-        return
+def get_conflict_level(submission1, submission2):
+    if submission1['scv'] == submission2['scv']:
+        return -1
 
-    date = matches.group(1)
+    if submission1['significance'] == submission2['significance']:
+        return 0
+    if submission1['normalized_significance_name'] == 'not provided' or submission2['normalized_significance_name'] == 'not provided':
+        return 0
 
-    #hack the ClinVar XML file into pieces to parse it in parallel
-    with open(filename, 'r+b') as f:
-        clinvarsets = re.findall(b'<ClinVarSet .+?</ClinVarSet>', mmap(f.fileno(), 0), re.DOTALL)
-    submission_sets = Pool().map(partial(get_submissions, date), clinvarsets)
-    submissions = [submission for submission_set in submission_sets for submission in submission_set]
+    if submission1['normalized_significance'] == submission2['normalized_significance']:
+        return 1
 
-    #do all the database imports at once to minimize the time that we hold the database lock
-    db = connect()
-    cursor = db.cursor()
+    return significance_conflict_levels.get(
+        (submission1['normalized_significance_name'], submission2['normalized_significance_name']), 4
+    )
 
-    cursor.executemany(
-        'INSERT OR REPLACE INTO submissions VALUES (' + ','.join('?' * len(submissions[0])) + ')', submissions
+def get_key(cursor, dimension, name, keys=None):
+    #look up the integer key of a name, adding the name to the dimension table if it is new
+    if keys != None and name in keys:
+        return keys[name]
+
+    cursor.execute('INSERT OR IGNORE INTO ' + dimension + ' (name) VALUES (?)', [name])
+    if cursor.rowcount == 1:
+        key = cursor.lastrowid
+    else:
+        key = list(cursor.execute('SELECT id FROM ' + dimension + ' WHERE name=?', [name]))[0][0]
+
+    if keys != None:
+        keys[name] = key
+    return key
+
+def get_submission_row(cursor, keys, submission):
+    #replace the names in a parsed submission with the keys of the dimension tables
+    (
+        date,
+        variant_id,
+        variant_name,
+        rsid,
+        gene,
+        gene_type,
+        normalized_gene,
+        normalized_gene_type,
+        submitter_id,
+        submitter_name,
+        submitter_country_code,
+        submitter_country_name,
+        rcv,
+        scv,
+        significance,
+        normalized_significance,
+        last_eval,
+        review_status,
+        star_level,
+        condition_name,
+        condition_xrefs,
+        method,
+        normalized_method,
+        comment,
+    ) = submission
+
+    if submitter_id not in keys['submitters']:
+        cursor.execute(
+            'INSERT OR IGNORE INTO submitters VALUES (?,?,?,?,?)',
+            [submitter_id, submitter_name, submitter_country_code, submitter_country_name, date]
+        )
+        cursor.execute(
+            'UPDATE submitters SET name=?, country_code=?, country_name=?, date=? WHERE id=? AND date<?',
+            [submitter_name, submitter_country_code, submitter_country_name, date, submitter_id, date]
+        )
+        keys['submitters'][submitter_id] = True
+
+    #remember each condition's key and whether cross-references have been seen for it yet
+    condition = keys['conditions'].get(condition_name)
+    if condition == None or (condition_xrefs and not condition[1]):
+        cursor.execute(
+            'INSERT OR IGNORE INTO conditions (name, xrefs, date) VALUES (?,?,?)',
+            [condition_name, condition_xrefs, date]
+        )
+        #within the same release, any cross-references are better than none
+        cursor.execute(
+            'UPDATE conditions SET xrefs=?, date=? WHERE name=? AND (date<? OR (date=? AND xrefs=\'\'))',
+            [condition_xrefs, date, condition_name, date, date]
+        )
+        condition_key = list(cursor.execute('SELECT id FROM conditions WHERE name=?', [condition_name]))[0][0]
+        condition = (condition_key, bool(condition_xrefs) or (condition != None and condition[1]))
+        keys['conditions'][condition_name] = condition
+
+    return (
+        date,
+        variant_id,
+        get_key(cursor, 'variants', variant_name), #too many variants to remember them all
+        rsid,
+        get_key(cursor, 'genes', gene, keys['genes']),
+        gene_type,
+        get_key(cursor, 'genes', normalized_gene, keys['genes']),
+        normalized_gene_type,
+        submitter_id,
+        rcv,
+        scv,
+        get_key(cursor, 'significances', significance, keys['significances']),
+        get_key(cursor, 'significances', normalized_significance, keys['significances']),
+        last_eval,
+        get_key(cursor, 'review_statuses', review_status, keys['review_statuses']),
+        star_level,
+        condition[0],
+        get_key(cursor, 'methods', method, keys['methods']),
+        get_key(cursor, 'methods', normalized_method, keys['methods']),
+        comment,
     )
 
-    cursor.execute('''
-        INSERT OR REPLACE INTO comparisons
-        SELECT
-            t1.*,
-            t2.submitter_id,
-            t2.submitter_name,
-            t2.scv,
-            t2.significance,
-            t2.normalized_significance,
-            t2.star_level,
-            t2.condition_name,
-            t2.normalized_method,
-            CASE
-                WHEN t1.scv=t2.scv THEN -1
-
-                WHEN t1.significance=t2.significance THEN 0
-                WHEN t1.normalized_significance="not provided" OR t2.normalized_significance="not provided" THEN 0
-
-                WHEN t1.normalized_significance=t2.normalized_significance THEN 1
-
-                WHEN t1.normalized_significance="benign" AND t2.normalized_significance="likely benign" THEN 2
-                WHEN t1.normalized_significance="likely benign" AND t2.normalized_significance="benign" THEN 2
-                WHEN t1.normalized_significance="pathogenic" AND t2.normalized_significance="likely pathogenic" THEN 2
-                WHEN t1.normalized_significance="likely pathogenic" AND t2.normalized_significance="pathogenic" THEN 2
-
-                WHEN t1.normalized_significance IN ("benign", "likely benign") AND t2.normalized_significance="uncertain significance" THEN 3
-                WHEN t1.normalized_significance="uncertain significance" AND t2.normalized_significance IN ("benign", "likely benign") THEN 3
-
-                WHEN t1.normalized_significance IN ("benign", "likely benign", "uncertain significance") AND t2.normalized_significance IN ("pathogenic", "likely pathogenic") THEN 5
-                WHEN t1.normalized_significance IN ("pathogenic", "likely pathogenic") AND t2.normalized_significance IN ("benign", "likely benign", "uncertain significance") THEN 5
-
-                ELSE 4
-            END AS conflict_level
-        FROM submissions t1 INNER JOIN submissions t2
-        ON t1.date=? AND t1.date=t2.date AND t1.variant_name=t2.variant_name
-    ''', [date])
+submission_columns = [
+    'date',
+    'variant_id',
+    'variant',
+    'rsid',
+    'gene',
+    'gene_type',
+    'normalized_gene',
+    'normalized_gene_type',
+    'submitter_id',
+    'rcv',
+    'scv',
+    'significance',
+    'normalized_significance',
+    'last_eval',
+    'review_status',
+    'star_level',
+    'condition',
+    'method',
+    'normalized_method',
+    'comment',
+]
 
-    db.commit()
-    db.close()
+def get_comparisons(cursor, submission_set):
+    #compare the new submissions to every submission of the same variant seen so far this month, including each other
+    date = submission_set[0][0]
+    variant = submission_set[0][2]
+    new_scvs = set(map(lambda submission: submission[10], submission_set)) #scv
+
+    #the normalized significance names are needed to look up conflict levels but are not part of the comparison
+    submissions = list(cursor.execute(
+        '''
+            SELECT submissions.*, significances.name AS normalized_significance_name
+            FROM submissions JOIN significances ON significances.id=submissions.normalized_significance
+            WHERE date=? AND variant=?
+        ''',
+        [date, variant]
+    ))
+    new_submissions = [submission for submission in submissions if submission['scv'] in new_scvs]
+    old_submissions = [submission for submission in submissions if submission['scv'] not in new_scvs]
+
+    for submission1, submission2 in chain(product(new_submissions, submissions), product(old_submissions, new_submissions)):
+        #refer to both submissions by key and keep only the columns that comparisons are filtered or grouped on
+        yield (
+            date,
+            submission1['id'],
+            submission2['id'],
+            variant,
+            submission1['gene'],
+            submission1['gene_type'],
+            submission1['normalized_gene'],
+            submission1['normalized_gene_type'],
+            submission1['submitter_id'],
+            submission1['significance'],
+            submission1['normalized_significance'],
+            submission1['star_level'],
+            submission1['condition'],
+            submission1['normalized_method'],
+            submission2['submitter_id'],
+            submission2['significance'],
+            submission2['normalized_significance'],
+            submission2['star_level'],
+            submission2['condition'],
+            submission2['normalized_method'],
+            get_conflict_level(submission1, submission2),
+        )
+
+def write_submissions(submission_sets, stats, filename, write_lock, batch_size=50000):
+    #insert the submissions and their comparisons in batches of transactions while the pool keeps parsing
+    db = connect(filename)
+    db.row_factory = sqlite3.Row
+    cursor = db.cursor()
+    keys = defaultdict(dict) #dimension keys already looked up during this import
+    batch = []
+    pending = 0
+    finished = False #whether the parser has said that there are no more submissions
+
+    try:
+        while True:
+            wait_start = time()
+            submission_set = submission_sets.get()
+            stats['writer_wait'] += time() - wait_start
+            finished = submission_set == None
+
+            if submission_set:
+                batch.append(submission_set)
+                pending += len(submission_set)
+
+            if batch and (submission_set == None or pending >= batch_size):
+                #other imports in the same process may be writing too, so take turns holding the database lock
+                with write_lock:
+                    write_start = time()
+                    for submission_set_to_write in batch:
+                        submission_rows = list(map(
+                            lambda submission: get_submission_row(cursor, keys, submission), submission_set_to_write
+                        ))
+                        #update a submission that is already there in place so that comparisons can keep its key
+                        cursor.executemany(
+                            'INSERT INTO submissions (' + ','.join(submission_columns) + ') ' +
+                            'VALUES (' + ','.join('?' * len(submission_columns)) + ') ' +
+                            'ON CONFLICT (date, scv) DO UPDATE SET ' +
+                            ','.join(map(lambda column: column + '=excluded.' + column, submission_columns)),
+                            submission_rows
+                        )
+                        comparisons = list(get_comparisons(cursor, submission_rows))
+                        cursor.executemany(
+                            'INSERT OR REPLACE INTO comparisons VALUES (' + ','.join('?' * len(comparisons[0])) + ')',
+                            comparisons
+                        )
+                        stats['comparisons'] += len(comparisons)
+                    db.commit()
+                    stats['writer_time'] += time() - write_start
+                stats['submissions'] += pending
+                batch = []
+                pending = 0
+
+            if submission_set == None:
+                break
+    except Exception as err:
+        stats['writer_error'] = err
+        #keep draining the queue so that the parser does not block forever, unless it is already done
+        while not finished:
+            finished = submission_sets.get() == None
+    finally:
+        db.close()
+
+def print_stats(stats, elapsed):
+    parse_time = elapsed - stats['parser_wait']
+    stdout.write(
+        '\r\033[K' +
+        'Parsed ' + str(stats['clinvarsets']) + ' ClinVarSets' +
+        ' (' + str(round(stats['clinvarsets'] / parse_time if parse_time else 0)) + '/s,' +
+        ' blocked on the writer for ' + str(round(stats['parser_wait'])) + 's),' +
+        ' wrote ' + str(stats['submissions']) + ' submissions and ' + str(stats['comparisons']) + ' comparisons' +
+        ' (' + str(round(stats['submissions'] / stats['writer_time'] if stats['writer_time'] else 0)) + '/s,' +
+        ' blocked on the parser for ' + str(round(stats['writer_wait'])) + 's)'
+    )
+    stdout.flush()
+
+def import_file(source, processes=None, write_lock=None, progress=True, shard=False, pool=None):
+    if source == '-':
+        date = None
+    else:
+        date = get_release_date(source)
+        if not date:
+            print('Skipped unrecognized filename ' + source)
+            return None
+
+    write_lock = write_lock or Lock()
+    checksum = sha256()
+
+    try:
+        with open_release(source, checksum) as f:
+            if source == '-':
+                #there is no filename, so use the date of the release set itself
+                date, f = read_release_date(f)
+                if not date:
+                    print('Skipped standard input without a release date')
+                    return None
+
+            print('Importing ' + source)
+            if shard:
+                #build the shard next to the old one and swap it in once it is complete
+                filename = get_shard_filename(date) + '.part'
+                makedirs('shards', exist_ok=True)
+                if exists(filename):
+                    remove(filename)
+                create_tables(filename)
+                stats = import_release(date, f, filename, processes, Lock(), progress, pool)
+                write_monthly_totals(filename, date)
+                rename(filename, get_shard_filename(date))
+            else:
+                stats = import_release(date, f, 'clinvar.db', processes, write_lock, progress, pool)
+                with write_lock:
+                    write_monthly_totals('clinvar.db', date)
+    except URLError as err:
+        print('Skipped unavailable release ' + source + ' (' + str(err.reason) + ')')
+        return None
+
+    #record the finished import so that an interrupted backfill knows not to repeat it
+    with write_lock:
+        db = connect()
+        db.execute(
+            'INSERT OR REPLACE INTO imports VALUES (?,?,?,?,?)',
+            [date, source, checksum.hexdigest(), stats['submissions'], stats['comparisons']]
+        )
+        db.commit()
+        db.close()
+
+    return stats
+
+def import_release(date, f, filename, processes, write_lock, progress, pool=None):
+    #parse the ClinVarSets in parallel as they are read and hand the results to a separate writer thread
+    chunk_size = 100
+    processes = processes or cpu_count()
+    in_flight = Semaphore(chunk_size * processes * 4)
+    submission_sets = Queue(chunk_size * processes)
+    stats = Counter()
+
+    #forking while other threads hold locks can leave the children stuck, so the parsers are started before the writer,
+    #or are shared by all imports and started before any of them
+    with nullcontext(pool) if pool else Pool(processes) as pool:
+        writer = Thread(target=write_submissions, args=(submission_sets, stats, filename, write_lock))
+        writer.start()
+        start_time = time()
+
+        try:
+            clinvarsets = throttle(get_clinvarsets(f), in_flight)
+            for submission_set in pool.imap_unordered(partial(get_submissions, date), clinvarsets, chunk_size):
+                in_flight.release()
+                stats['clinvarsets'] += 1
+                wait_start = time()
+                submission_sets.put(submission_set)
+                stats['parser_wait'] += time() - wait_start
+                if progress and stats['clinvarsets'] % 10000 == 0:
+                    print_stats(stats, time() - start_time)
+        finally:
+            submission_sets.put(None)
+            writer.join()
+
+    if stats['writer_error']:
+        raise stats['writer_error']
+
+    print_stats(stats, time() - start_time)
+    print()
+
+    return stats
 
 if __name__ == '__main__':
-    if len(argv) < 2:
-        print('Usage: ./import-clinvar-xml.py ClinVarFullRelease_<year>-<month>.xml ...')
+    shard = '--shards' in argv
+    sources = [arg for arg in argv[1:] if arg != '--shards']
+    if not sources:
+        print('Usage: ./import-clinvar-xml.py [--shards] ClinVarFullRelease_<year>-<month>.xml[.gz] ...')
+        print('Each release can be a local file, a URL, or - for standard input.')
+        print('With --shards, each release is written to its own database in the shards directory.')
         exit()
 
     create_tables()
-    for filename in argv[1:]:
-        import_file(filename)
+    create_imports_table()
+    for source in sources:
+        import_file(source, shard=shard)
+    backfill_monthly_totals()
@@ -1,17 +1,4 @@
 #!/bin/bash
 
-function import {
-    url=$1
-    filename=$2
-    echo Downloading $url
-    curl $url | gunzip > $filename 2> /dev/null
-    if [ -s $filename ]; then
-        if ./import-clinvar-xml.py $filename; then
-            rm $filename
-        fi
-    fi
-    echo
-}
-
-filename=ClinVarFullRelease_$(date +%Y-%m).xml
-import ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/xml/$filename.gz $filename
+./import-clinvar-xml.py ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/xml/ClinVarFullRelease_$(date +%Y-%m).xml.gz
+echo
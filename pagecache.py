@@ -0,0 +1,236 @@
+import sqlite3
+from fcntl import LOCK_EX, LOCK_NB, LOCK_UN, lockf
+from hashlib import sha256
+from threading import Event, Lock, Thread
+from time import sleep, time
+
+#pages cached by an older layout of the file are not worth converting
+schema_version = 3
+
+class PageCache():
+    #every cached page of a release in one SQLite file, once for each encoding that it is compressed with, with the least
+    #recently used pages deleted once they add up to more than max_bytes
+    def __init__(self, filename, max_bytes, max_wait=300):
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.stats = {'hits': 0, 'misses': 0}
+        self.lock = Lock()
+        self.closed = False
+
+        #the pages being rendered by this process, and a file whose bytes are locked for the pages that any process renders
+        self.renders = {}
+        self.revalidations = set()
+        self.renders_lock = Lock()
+        self.render_locks = open(filename + '-locks', 'a')
+        self.db = sqlite3.connect(filename, timeout=20, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL') #let the other web server processes read while one of them writes
+        self.db.execute('PRAGMA synchronous=NORMAL')
+
+        self.db.execute('BEGIN IMMEDIATE')
+        if list(self.db.execute('PRAGMA user_version'))[0][0] != schema_version:
+            self.db.execute('DROP TABLE IF EXISTS pages')
+            self.db.execute('DROP TABLE IF EXISTS total')
+            self.db.execute('PRAGMA user_version=' + str(schema_version))
+
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT,
+                encoding TEXT,
+                content_type TEXT,
+                etag TEXT,
+                body BLOB,
+                size INTEGER,
+                stale REAL,
+                expires REAL,
+                used REAL,
+                PRIMARY KEY (url, encoding)
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pages__used ON pages (used)')
+
+        #keep a running total of the size of the pages so that it never has to be added up
+        self.db.execute('CREATE TABLE IF NOT EXISTS total (size INTEGER)')
+        self.db.execute('INSERT INTO total SELECT 0 WHERE NOT EXISTS (SELECT * FROM total)')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS pages__insert AFTER INSERT ON pages
+            BEGIN UPDATE total SET size=size+new.size; END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS pages__update AFTER UPDATE OF size ON pages
+            BEGIN UPDATE total SET size=size+new.size-old.size; END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS pages__delete AFTER DELETE ON pages
+            BEGIN UPDATE total SET size=size-old.size; END
+        ''')
+        self.db.execute('COMMIT')
+
+    def count(self, hit):
+        with self.lock:
+            self.stats['hits' if hit else 'misses'] += 1
+
+    def get(self, url, encoding, expired=False):
+        #a page past its stale time is still returned, and one past its expiry time only if expired is set, for when the
+        #page cannot be rendered again
+        now = time()
+        with self.lock:
+            rows = list(self.db.execute(
+                'SELECT content_type, etag, body, stale, expires, used FROM pages WHERE url=? AND encoding=?',
+                [url, encoding]
+            )) if not self.closed else []
+            if not rows:
+                return None
+
+            content_type, etag, body, stale, expires, used = rows[0]
+            if expires and expires <= now and not expired:
+                return None
+
+            #writing down every hit would make readers take turns, and to within a minute is recent enough; a reader does
+            #not wait long for another process that is writing, because the page can be marked as used on a later hit
+            if used < now - 60:
+                self.db.execute('PRAGMA busy_timeout=100')
+                try:
+                    self.db.execute('UPDATE pages SET used=? WHERE url=? AND encoding=?', [now, url, encoding])
+                except sqlite3.OperationalError:
+                    pass
+                finally:
+                    self.db.execute('PRAGMA busy_timeout=20000')
+            return {'content_type': content_type, 'etag': etag, 'body': body, 'stale': stale != 0 and stale <= now}
+
+    def lock_render(self, url):
+        #only one request at a time renders a page that is not cached, so that a burst of requests for a slow page does
+        #not run all of its queries at once; returns True if this request should render the page and unlock it after,
+        #or False if another request of this process rendered it in the meantime or waiting took too long
+        with self.renders_lock:
+            render = self.renders.get(url)
+            if render == None:
+                self.renders[url] = Event()
+        if render != None:
+            render.wait(self.max_wait)
+            return False
+
+        #record locks belong to the whole process, which is why the threads have to take turns first; a byte at an
+        #offset given by the URL keeps pages from waiting for each other without a lock file for every page
+        offset = int(sha256(url.encode()).hexdigest()[0:15], 16)
+        deadline = time() + self.max_wait
+        delay = 0.01
+        while True:
+            try:
+                lockf(self.render_locks, LOCK_EX | LOCK_NB, 1, offset)
+                return True
+            except OSError:
+                #give up waiting if the other process is stuck, and let the waiting threads of this one go too
+                if time() > deadline:
+                    with self.renders_lock:
+                        self.renders.pop(url).set()
+                    return False
+                sleep(delay)
+                delay = min(delay * 2, 0.2)
+            except ValueError:
+                #the cache was closed for a newer one while waiting
+                with self.renders_lock:
+                    self.renders.pop(url).set()
+                return False
+
+    def unlock_render(self, url):
+        with self.renders_lock:
+            if not self.render_locks.closed:
+                lockf(self.render_locks, LOCK_UN, 1, int(sha256(url.encode()).hexdigest()[0:15], 16))
+            self.renders.pop(url).set()
+
+    def revalidate(self, url, render):
+        #render a stale page again in the background, once across all threads and processes, while the stale page is
+        #served in the meantime
+        with self.renders_lock:
+            if url in self.revalidations:
+                return
+            self.revalidations.add(url)
+
+        def run():
+            try:
+                if self.lock_render(url):
+                    try:
+                        #another process may have rendered the page while this one waited for the lock
+                        if not self.has(url, 'gzip'):
+                            render()
+                    finally:
+                        self.unlock_render(url)
+            finally:
+                with self.renders_lock:
+                    self.revalidations.discard(url)
+
+        Thread(target=run, daemon=True).start()
+
+    def has(self, url, encoding):
+        #whether a page is cached that is not stale yet
+        with self.lock:
+            return not self.closed and bool(list(self.db.execute(
+                'SELECT 1 FROM pages WHERE url=? AND encoding=? AND (stale=0 OR stale>?)', [url, encoding, time()]
+            )))
+
+    def set(self, url, content_type, bodies, ttl, hard_ttl):
+        #bodies maps each encoding to an (etag, body) pair, and they are stored together so that none of them goes stale;
+        #the page goes stale after ttl seconds and expires after hard_ttl seconds, or never if zero
+        now = time()
+        expires = now + max(ttl, hard_ttl) if hard_ttl else 0
+        with self.lock:
+            if self.closed:
+                return False
+
+            #the hits of this process wait for the lock too, so do not wait long for another process that is writing
+            self.db.execute('PRAGMA busy_timeout=100')
+            try:
+                self.db.execute('BEGIN IMMEDIATE')
+            except sqlite3.OperationalError:
+                return False #another process is writing or deleting old pages, so skip this page
+            finally:
+                self.db.execute('PRAGMA busy_timeout=20000')
+
+            try:
+                for encoding, (etag, body) in bodies.items():
+                    self.db.execute(
+                        '''
+                            INSERT INTO pages VALUES (?,?,?,?,?,?,?,?,?) ON CONFLICT (url, encoding) DO UPDATE SET
+                            content_type=excluded.content_type, etag=excluded.etag, body=excluded.body,
+                            size=excluded.size, stale=excluded.stale, expires=excluded.expires, used=excluded.used
+                        ''',
+                        [url, encoding, content_type, etag, body, len(body), now + ttl if ttl else 0, expires, now]
+                    )
+
+                #make room for a tenth more pages at a time so that not every new page has to delete an old one
+                if self.size() > self.max_bytes:
+                    self.db.execute('''
+                        DELETE FROM pages WHERE rowid IN (
+                            SELECT rowid FROM (
+                                SELECT rowid, size, SUM(size) OVER (ORDER BY used, rowid) AS cumulative_size FROM pages
+                            ) WHERE cumulative_size-size<(SELECT size FROM total)-?
+                        )
+                    ''', [self.max_bytes * 9 // 10])
+                self.db.execute('COMMIT')
+                return True
+            except sqlite3.Error:
+                self.db.execute('ROLLBACK')
+                raise
+
+    def size(self):
+        return list(self.db.execute('SELECT size FROM total'))[0][0]
+
+    def close(self):
+        #requests that were still using the cache when a newer one replaced it find nothing in it and store nothing in it
+        with self.lock:
+            self.closed = True
+            self.db.close()
+        with self.renders_lock:
+            self.render_locks.close()
+
+    def timing(self):
+        #how often this process found the page in the cache, and how full the cache is
+        with self.lock:
+            if self.closed:
+                return None
+            requests = self.stats['hits'] + self.stats['misses']
+            return (
+                'page-cache;desc="' + str(round(100 * self.stats['hits'] / requests if requests else 0)) + '% of ' +
+                str(requests) + ' pages cached since start, ' + str(round(self.size() / (1 << 20), 1)) + ' of ' +
+                str(round(self.max_bytes / (1 << 20), 1)) + ' MiB used"'
+            )
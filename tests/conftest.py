@@ -0,0 +1,94 @@
+from os import chdir, getcwd
+from os.path import abspath, dirname
+import random
+import runpy
+import sys
+
+import pytest
+
+repo_dir = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+def load_script(name):
+    #the scripts read their data files from the working directory when they are imported
+    cwd = getcwd()
+    chdir(repo_dir)
+    try:
+        return __import__(name)
+    finally:
+        chdir(cwd)
+
+def make_release(dated, clinvarsets, seed=1, header=''):
+    #a small ClinVar release with a few submitters that often disagree, so that every conflict level comes up
+    rng = random.Random(seed)
+    significances = [
+        'pathogenic', 'likely pathogenic', 'uncertain significance', 'likely benign', 'benign', 'not provided',
+        'Pathogenic/Likely pathogenic', 'risk factor',
+    ]
+    methods = ['clinical testing', 'research', 'literature only', 'curation']
+    statuses = [
+        'criteria provided, single submitter', 'no assertion provided', 'reviewed by expert panel',
+        'practice guideline', 'no assertion criteria provided',
+    ]
+    genes = ['BRCA1', 'BRCA2', 'TP53', 'MLH1', 'MLH1-AS1', '']
+    conditions = [
+        ('Breast cancer', 'MedGen', 'C0001'), ('Lynch syndrome', 'OMIM', '120435'), ('not specified', None, None),
+    ]
+
+    xml = ['<?xml version="1.0"?>\n', header, '<ReleaseSet Dated="' + dated + '">\n']
+    scv = 0
+    for i in range(clinvarsets):
+        variant = rng.randrange(max(1, clinvarsets // 3))
+        gene_names = filter(None, [rng.choice(genes), rng.choice(genes) if variant % 5 == 0 else None])
+        condition = conditions[variant % len(conditions) if rng.random() < 0.6 else rng.randrange(len(conditions))]
+        xml.append(
+            '<ClinVarSet ID="' + str(i) + '">\n<ReferenceClinVarAssertion>\n' +
+            '<ClinVarAccession Acc="RCV' + str(i).zfill(9) + '" Type="RCV"/>\n' +
+            '<MeasureSet ID="' + str(variant) + '"><Name><ElementValue Type="Preferred">NM_' + str(variant) +
+            ':c.' + str(variant) + 'A&gt;G</ElementValue></Name>\n' +
+            '<Measure><XRef Type="rs" ID="' + str(1000 + variant) + '" DB="dbSNP"/>'
+        )
+        for gene in gene_names:
+            xml.append(
+                '<MeasureRelationship Type="within single gene"><Symbol><ElementValue Type="Preferred">' + gene +
+                '</ElementValue></Symbol></MeasureRelationship>'
+            )
+        xml.append('</Measure></MeasureSet>\n')
+        if condition[1]:
+            xml.append(
+                '<TraitSet><Trait><Name><ElementValue Type="Preferred">' + condition[0] + '</ElementValue></Name>' +
+                '<XRef DB="' + condition[1] + '" ID="' + condition[2] + '"/></Trait></TraitSet>\n'
+            )
+        xml.append('</ReferenceClinVarAssertion>\n')
+        for j in range(rng.randint(1, 4)):
+            scv += 1
+            submitter_id = str(rng.choice([1, 2, 3, 500008, 26957]))
+            xml.append(
+                '<ClinVarAssertion><ClinVarAccession Acc="SCV' + str(scv).zfill(9) + '" Type="SCV" OrgID="' +
+                submitter_id + '"/><ClinVarSubmissionID submitter="Lab ' + submitter_id + '"/>' +
+                '<ClinicalSignificance DateLastEvaluated="2018-01-01"><ReviewStatus>' + rng.choice(statuses) +
+                '</ReviewStatus><Description>' + rng.choice(significances) + '</Description></ClinicalSignificance>' +
+                '<ObservedIn><Method><MethodType>' + rng.choice(methods) + '</MethodType></Method></ObservedIn>' +
+                '</ClinVarAssertion>\n'
+            )
+        xml.append('</ClinVarSet>\n')
+    xml.append('</ReleaseSet>\n')
+    return ''.join(xml).encode()
+
+@pytest.fixture(scope='session')
+def importer():
+    return load_script('import-clinvar-xml')
+
+@pytest.fixture(scope='session')
+def release_dir(importer, tmp_path_factory):
+    path = tmp_path_factory.mktemp('release')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(path)
+        importer.create_tables()
+        importer.create_imports_table()
+        for seed, month in enumerate(['2019-03', '2019-04']):
+            (path / ('ClinVarFullRelease_' + month + '.xml')).write_bytes(make_release(month + '-01', 600, seed))
+            importer.import_file('ClinVarFullRelease_' + month + '.xml', 2, progress=False)
+        importer.backfill_monthly_totals()
+        runpy.run_path(repo_dir + '/create-current-tables.py')
+        yield path
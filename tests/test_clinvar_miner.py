@@ -0,0 +1,137 @@
+from concurrent.futures import Future
+from threading import Thread
+from time import sleep
+from types import SimpleNamespace
+import json
+import sqlite3
+
+import pytest
+
+from conftest import load_script
+import db
+
+@pytest.fixture(scope='module')
+def miner():
+    return load_script('clinvar-miner')
+
+@pytest.fixture
+def client(miner, release_dir, tmp_path, monkeypatch):
+    #the site with an empty page cache of its own
+    monkeypatch.chdir(release_dir)
+    monkeypatch.setattr(miner, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(miner, 'caches', {})
+    monkeypatch.setattr(miner, 'ttl', 0)
+    monkeypatch.setattr(miner, 'brotli', None)
+    yield miner.app.test_client()
+    for cache in miner.caches.values():
+        cache.close()
+
+def test_missing_release_is_unavailable(miner, tmp_path, monkeypatch):
+    #create-current-tables.py has not run yet
+    monkeypatch.chdir(tmp_path)
+    sqlite3.connect('clinvar.db').close()
+    monkeypatch.setattr(miner, 'caches', {})
+    monkeypatch.setattr(miner, 'ttl', 0)
+
+    response = miner.app.test_client().get('/')
+    assert response.status_code == 503
+    assert b'create-current-tables.py' in response.get_data()
+    assert miner.caches == {}
+
+def test_missing_encoding_is_added_to_cached_page(miner, client, monkeypatch):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    cache = miner.get_cache()
+    assert cache.has('http://localhost/', 'gzip')
+
+    #Brotli is installed after the page was cached with gzip only
+    monkeypatch.setattr(miner, 'brotli', SimpleNamespace(compress=lambda data, quality: b'br:' + data))
+    response = client.get('/', headers={'Accept-Encoding': 'br, gzip'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.get_data().startswith(b'br:')
+    assert response.headers['ETag']
+    assert cache.has('http://localhost/', 'br')
+
+    hits = cache.stats['hits']
+    response = client.get('/', headers={'Accept-Encoding': 'br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert cache.stats['hits'] == hits + 1
+
+def test_concurrent_misses_render_once(miner, client, monkeypatch):
+    renders = []
+    render_template_async = miner.render_template_async
+    def slow_render(*args, **kwargs):
+        renders.append(True)
+        sleep(0.3)
+        return render_template_async(*args, **kwargs)
+    monkeypatch.setattr(miner, 'render_template_async', slow_render)
+
+    responses = []
+    threads = [
+        Thread(target=lambda: responses.append(miner.app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})))
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert renders == [True]
+    assert list(map(lambda response: response.status_code, responses)) == [200] * 4
+    assert len(set(map(lambda response: response.get_data(), responses))) == 1
+
+def test_unreadable_release_raises_original_error(miner, tmp_path, monkeypatch):
+    #a current.db without any tables cannot give the release date that names its cache
+    monkeypatch.chdir(tmp_path)
+    sqlite3.connect('clinvar.db').close()
+    sqlite3.connect('current.db').close()
+    monkeypatch.setattr(miner, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(miner, 'caches', {})
+    monkeypatch.setattr(miner, 'ttl', 0)
+    monkeypatch.setattr(miner.app, 'testing', True)
+
+    errors = []
+    get_cache = miner.get_cache
+    def get_cache_and_record_errors():
+        try:
+            return get_cache()
+        except sqlite3.OperationalError as err:
+            errors.append(err)
+            raise
+    monkeypatch.setattr(miner, 'get_cache', get_cache_and_record_errors)
+
+    with pytest.raises(sqlite3.OperationalError) as raised:
+        miner.app.test_client().get('/')
+    assert raised.value is errors[0]
+
+def test_pages_do_not_change_cached_results(miner, release_dir, monkeypatch):
+    #the query cache hands the same rows to every page, so they must stay as they were when they were cached
+    monkeypatch.chdir(release_dir)
+    monkeypatch.setattr(miner, 'ttl', -1)
+    monkeypatch.setattr(db, 'query_cache', db.OrderedDict())
+    monkeypatch.setattr(db, 'query_cache_stats', {'hits': 0, 'misses': 0, 'rows': 0})
+
+    def dump(result):
+        return json.dumps(result, sort_keys=True, default=str)
+
+    cached = {}
+    cache_result = db.cache_result
+    def record(key, result):
+        if isinstance(result, Future):
+            result.add_done_callback(lambda future: cached.setdefault(key, dump(future.result())))
+        else:
+            cached[key] = dump(result)
+        cache_result(key, result)
+    monkeypatch.setattr(db, 'cache_result', record)
+
+    client = miner.app.test_client()
+    for rule in miner.app.url_map.iter_rules():
+        if not rule.arguments and 'GET' in rule.methods:
+            client.get(rule.rule)
+            client.get(rule.rule)
+
+    assert cached
+    with db.query_cache_lock:
+        entries = list(db.query_cache.items())
+    for key, (result, rows) in entries:
+        assert dump(result.result() if isinstance(result, Future) else result) == cached[key], key
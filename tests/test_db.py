@@ -0,0 +1,112 @@
+import json
+import random
+import sqlite3
+
+import pytest
+
+import db
+
+#every count can also be made from the comparisons table alone, the way that the queries were written before the
+#submission, variant, totals and submitter pair tables
+class OriginalQueries(db.DB):
+    def comparisons(self, kwargs, pairwise = False, variants_only = False):
+        return 'current_comparisons'
+
+    def totals_min_stars(self, kwargs, other_filters):
+        return None
+
+methods = [
+    'submissions',
+    'total_conditions',
+    'total_genes',
+    'total_submitters',
+    'total_submissions_by_country',
+    'total_submissions_by_method',
+    'total_submissions_by_submitter',
+    'total_variants',
+    'total_variants_at_conflict_levels',
+    'total_variants_by_condition',
+    'total_variants_by_condition_and_significance',
+    'total_variants_by_condition_at_conflict_levels',
+    'total_variants_by_gene',
+    'total_variants_by_gene_and_significance',
+    'total_variants_by_gene_at_conflict_levels',
+    'total_variants_by_significance',
+    'total_variants_by_submitter',
+    'total_variants_by_submitter_and_significance',
+    'total_variants_by_submitter_at_conflict_levels',
+    'total_variants_in_conflict_by_condition_and_conflict_level',
+    'total_variants_in_conflict_by_conflict_level',
+    'total_variants_in_conflict_by_gene_and_conflict_level',
+    'total_variants_in_conflict_by_significance_and_significance',
+    'total_variants_in_conflict_by_submitter_and_conflict_level',
+    'variants',
+]
+
+#the filters that the pages pass, with how often each one is tried
+filters = {
+    'min_stars1': ([-1, 0, 1, 2, 3, 4], 0.5),
+    'min_stars2': ([-1, 0, 1, 2, 3, 4], 0.5),
+    'min_stars': ([-1, 1, 2, 3], 0.5),
+    'min_conflict_level': ([-1, 0, 1, 2, 3, 5], 0.6),
+    'normalized_method1': (['clinical testing'], 0.15),
+    'normalized_method2': (['literature only'], 0.15),
+    'normalized_method': (['clinical testing'], 0.15),
+    'gene': (['BRCA1', ['BRCA2', 'TP53'], '', []], 0.15),
+    'original_genes': (['1'], 0.15),
+    'gene_type': ([1], 0.15),
+    'condition1_name': (['Breast cancer', ['not specified', 'Lynch syndrome'], []], 0.15),
+    'submitter1_id': ([1, 500008, [2, 26957], []], 0.4),
+    'submitter2_id': ([0, 2, 26957], 0.2),
+    'significance1': (['pathogenic'], 0.15),
+    'significance2': (['benign'], 0.15),
+    'original_terms': (['1'], 0.15),
+    'country_code': (['US'], 0.15),
+    'submitter_ids': ([[2, 26957], []], 0.15),
+}
+
+def random_filters(rng, method):
+    kwargs = {}
+    for name, (values, frequency) in filters.items():
+        if rng.random() < frequency:
+            kwargs[name] = rng.choice(values)
+    if rng.random() < 0.3:
+        #the same number of stars on both sides is what the totals tables are for
+        kwargs['min_stars1'] = kwargs['min_stars2'] = rng.choice([-1, 0, 1, 2, 3, 4])
+    if method.endswith('_at_conflict_levels'):
+        kwargs['min_conflict_levels'] = [-1, 0, rng.choice([1, 2, 3, 4, 5])]
+    return kwargs
+
+def run(queries, method, kwargs):
+    db.query_cache.clear()
+    result = getattr(queries, method)(**kwargs)
+    result = result.result() if hasattr(result, 'result') else result
+
+    if method == 'variants':
+        #any of a variant's rsids can be listed
+        result = list(map(lambda row: row['variant_name'], result))
+    elif method == 'total_variants_in_conflict_by_significance_and_significance':
+        #the conflict level is not grouped by, so SQLite can take it from any of the rows
+        result = list(map(lambda row: dict(row, conflict_level=None), result))
+    return normalize(result)
+
+def normalize(result):
+    #rows in any order
+    if isinstance(result, sqlite3.Row):
+        result = dict(result)
+    if isinstance(result, dict):
+        return {str(key): normalize(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return sorted(map(lambda row: json.dumps(normalize(row), sort_keys=True), result))
+    return result
+
+@pytest.mark.parametrize('method', methods)
+def test_same_results_as_original_queries(release_dir, monkeypatch, method):
+    monkeypatch.chdir(release_dir)
+    rng = random.Random(method)
+    mismatches = []
+    for trial in range(40):
+        kwargs = random_filters(rng, method)
+        if run(db.DB(), method, kwargs) != run(OriginalQueries(), method, kwargs):
+            mismatches.append(kwargs)
+    assert mismatches == []
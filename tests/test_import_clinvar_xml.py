@@ -0,0 +1,118 @@
+from functools import partial
+from hashlib import sha256
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BufferedReader, BytesIO
+from threading import Lock, Thread
+from types import SimpleNamespace
+import gzip
+import sqlite3
+
+import pytest
+
+from conftest import make_release
+
+def get_imports():
+    db = sqlite3.connect('clinvar.db')
+    imports = list(db.execute('SELECT date, sha256, submissions, comparisons FROM imports'))
+    db.close()
+    return imports
+
+@pytest.fixture
+def release_server(tmp_path):
+    #a local stand-in for the NCBI server
+    served_dir = tmp_path / 'served'
+    served_dir.mkdir()
+    handler = partial(SimpleHTTPRequestHandler, directory=str(served_dir))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield served_dir, 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+    server.shutdown()
+    server.server_close()
+
+def test_import_from_url(importer, release_server, tmp_path, monkeypatch):
+    served_dir, url = release_server
+    release = make_release('2019-03-01', 300)
+    compressed = gzip.compress(release)
+    (served_dir / 'ClinVarFullRelease_2019-03.xml.gz').write_bytes(compressed)
+
+    #the same release imported from a decompressed local file
+    (tmp_path / 'local').mkdir()
+    monkeypatch.chdir(tmp_path / 'local')
+    (tmp_path / 'local' / 'ClinVarFullRelease_2019-03.xml').write_bytes(release)
+    importer.create_tables()
+    importer.create_imports_table()
+    importer.import_file('ClinVarFullRelease_2019-03.xml', 2, progress=False)
+    local_imports = get_imports()
+
+    (tmp_path / 'remote').mkdir()
+    monkeypatch.chdir(tmp_path / 'remote')
+    importer.create_tables()
+    importer.create_imports_table()
+    stats = importer.import_file(url + 'ClinVarFullRelease_2019-03.xml.gz', 2, progress=False)
+    assert stats['submissions'] > 0
+
+    #the checksum is of the file as it was downloaded, before decompression
+    [(date, checksum, submissions, comparisons)] = get_imports()
+    assert date == '2019-03'
+    assert checksum == sha256(compressed).hexdigest()
+    assert (submissions, comparisons) == (local_imports[0][2], local_imports[0][3])
+
+def test_import_missing_url(importer, release_server, tmp_path, monkeypatch):
+    served_dir, url = release_server
+    monkeypatch.chdir(tmp_path)
+    importer.create_tables()
+    importer.create_imports_table()
+    assert importer.import_file(url + 'ClinVarFullRelease_2019-03.xml.gz', 2, progress=False) == None
+    assert get_imports() == []
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_import_from_stdin_with_long_header(importer, tmp_path, monkeypatch, compress):
+    #the release set tag comes after more than a buffer's worth of comments
+    release = make_release('2019-04-01', 50, header='<!--' + 'x' * 100000 + '-->\n')
+    if compress:
+        release = gzip.compress(release)
+    monkeypatch.setattr(importer, 'stdin', SimpleNamespace(buffer=BufferedReader(BytesIO(release))))
+    monkeypatch.chdir(tmp_path)
+    importer.create_tables()
+    importer.create_imports_table()
+    assert importer.import_file('-', 2, progress=False)['submissions'] > 0
+    assert get_imports()[0][0:2] == ('2019-04', sha256(release).hexdigest())
+
+def test_read_release_date_gives_back_the_head(importer):
+    release = make_release('2019-05-01', 20, header='<!--' + 'x' * 200000 + '-->\n')
+    date, f = importer.read_release_date(BytesIO(release))
+    assert date == '2019-05'
+    assert b''.join(iter(partial(f.read, 1000), b'')) == release
+
+    date, f = importer.read_release_date(BytesIO(b'<?xml version="1.0"?>\n<ClinVarSet ID="1"></ClinVarSet>'))
+    assert date == None
+
+def test_writer_error_is_raised(importer, tmp_path, monkeypatch):
+    #the final flush is the only one for a small release, so the error comes after the parser is done
+    def get_comparisons(cursor, submission_rows):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(importer, 'get_comparisons', get_comparisons)
+    monkeypatch.chdir(tmp_path)
+    importer.create_tables()
+    release = make_release('2019-06-01', 20)
+    with pytest.raises(sqlite3.OperationalError):
+        importer.import_release('2019-06', BytesIO(release), 'clinvar.db', 2, Lock(), False)
+
+def test_old_layout_is_not_imported_into(importer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    importer.create_tables()
+    importer.create_tables() #the current layout is kept
+
+    #the text columns that submissions had before the dimension tables
+    db = sqlite3.connect('old.db')
+    db.execute('CREATE TABLE submissions (date TEXT, scv TEXT, variant_name TEXT, PRIMARY KEY (date, scv))')
+    db.close()
+    with pytest.raises(SystemExit, match='make clean && make'):
+        importer.create_tables('old.db')
+
+    #the copied columns that comparisons had before it referred to submission rows
+    db = sqlite3.connect('old-comparisons.db')
+    db.execute('CREATE TABLE comparisons (date TEXT, scv1 TEXT, scv2 TEXT, PRIMARY KEY (date, scv1, scv2))')
+    db.close()
+    with pytest.raises(SystemExit, match='make clean && make'):
+        importer.create_tables('old-comparisons.db')
@@ -0,0 +1,128 @@
+from hashlib import sha256
+from threading import Thread
+from time import sleep, time
+import subprocess
+import sys
+
+import pytest
+
+import pagecache
+
+@pytest.fixture
+def clock(monkeypatch):
+    #the times that pages are stored, used, go stale and expire at
+    now = [1000.0]
+    monkeypatch.setattr(pagecache, 'time', lambda: now[0])
+    return now
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = pagecache.PageCache(str(tmp_path / 'cache.db'), 1000, max_wait=0.5)
+    yield cache
+    cache.close()
+
+def store(cache, url, size, ttl=0, hard_ttl=0):
+    return cache.set(url, 'text/html', {'gzip': (url, b'x' * size)}, ttl, hard_ttl)
+
+def test_least_recently_used_pages_are_evicted(cache, clock):
+    store(cache, 'a', 400)
+    clock[0] += 100
+    store(cache, 'b', 400)
+    clock[0] += 100
+    assert cache.get('a', 'gzip') #a is now used more recently than b
+    clock[0] += 100
+
+    #going over the budget deletes the oldest pages until a tenth of it is free
+    store(cache, 'c', 400)
+    assert cache.has('a', 'gzip')
+    assert not cache.has('b', 'gzip')
+    assert cache.has('c', 'gzip')
+    assert cache.size() == 800
+
+def test_stale_and_expired_pages(cache, clock):
+    store(cache, 'page', 10, ttl=10, hard_ttl=100)
+    clock[0] += 5
+    assert cache.get('page', 'gzip')['stale'] == False
+    assert cache.has('page', 'gzip')
+
+    #a stale page is still served, but no longer counts as cached
+    clock[0] += 10
+    assert cache.get('page', 'gzip')['stale'] == True
+    assert not cache.has('page', 'gzip')
+
+    #an expired page is only served when it cannot be rendered again
+    clock[0] += 100
+    assert cache.get('page', 'gzip') == None
+    assert cache.get('page', 'gzip', expired=True)['body'] == b'x' * 10
+
+    #without a hard time to live, a stale page never expires
+    store(cache, 'forever', 10, ttl=10)
+    clock[0] += 1e6
+    assert cache.get('forever', 'gzip')['stale'] == True
+
+def test_one_request_renders_while_the_others_wait(cache):
+    assert cache.lock_render('page')
+
+    results = []
+    waiter = Thread(target=lambda: results.append(cache.lock_render('page')))
+    waiter.start()
+    sleep(0.1)
+    assert waiter.is_alive()
+
+    #the waiting request takes the page from the cache instead of rendering it again
+    cache.unlock_render('page')
+    waiter.join(5)
+    assert results == [False]
+    assert cache.lock_render('page')
+    cache.unlock_render('page')
+
+def test_waiting_for_another_process_times_out(cache, tmp_path):
+    #another process holds the byte of the render lock file that belongs to the page
+    offset = int(sha256(b'page').hexdigest()[0:15], 16)
+    holder = subprocess.Popen(
+        [
+            sys.executable, '-c',
+            'from fcntl import LOCK_EX, lockf; import sys\n' +
+            'f = open(sys.argv[1], "a"); lockf(f, LOCK_EX, 1, int(sys.argv[2])); print(flush=True); sys.stdin.read()',
+            str(tmp_path / 'cache.db-locks'), str(offset),
+        ],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    try:
+        holder.stdout.readline()
+        start = time()
+        assert cache.lock_render('page') == False
+        assert 0.5 <= time() - start < 5
+        assert 'page' not in cache.renders
+    finally:
+        holder.communicate()
+
+    assert cache.lock_render('page')
+    cache.unlock_render('page')
+
+def test_stale_page_is_revalidated_once(cache, clock):
+    store(cache, 'page', 10, ttl=10)
+    clock[0] += 20
+
+    renders = []
+    def render():
+        sleep(0.2)
+        renders.append(True)
+        store(cache, 'page', 10, ttl=10)
+    cache.revalidate('page', render)
+    cache.revalidate('page', render)
+
+    for wait in range(50):
+        if not cache.revalidations:
+            break
+        sleep(0.1)
+    assert renders == [True]
+    assert cache.get('page', 'gzip')['stale'] == False
+
+    #a page that another process rendered in the meantime is not rendered again
+    cache.revalidate('page', render)
+    for wait in range(50):
+        if not cache.revalidations:
+            break
+        sleep(0.1)
+    assert renders == [True]